@@ -5,6 +5,10 @@ import time
 import os
 import json
 import datetime
+import argparse
+
+# --measure-startup cuenta desde aquí, antes de importar pygame
+STARTUP_START = time.perf_counter()
 
 import pygame
 from pygame.locals import *
@@ -15,9 +19,81 @@ import scripts.anim_loader as anim_loader
 import scripts.particles as particles_m
 from scripts.entity import Entity
 import scripts.text as text
-from scripts.clip import clip
+import scripts.replay as replay_m
+import scripts.profiler as profiler_m
+import scripts.trace as trace_m
+from scripts.background import BackgroundRenderer
+from scripts.presenter import Presenter
+from scripts.lighting import LightMap
+from scripts.atlas import atlas
+from scripts.asset_cache import asset_cache
+import scripts.asset_loader as asset_loader_m
+from scripts.sound_bank import SoundBank
+import scripts.music as music_m
+import scripts.quality as quality_m
+import scripts.history_store as history_store
+import scripts.history_db as history_db
+import scripts.history_writer as history_writer
 
 TILE_SIZE = 12
+GAMEPLAY_ANIMATIONS = ['player_idle', 'player_run', 'player_jump', 'soul_idle']
+SETTINGS_FILE = 'data/settings.json'
+
+arg_parser = argparse.ArgumentParser(description='NetGuardian - The Last Firewall')
+arg_parser.add_argument('--record', metavar='PATH', help='record seed and input to a replay file')
+arg_parser.add_argument('--replay', metavar='PATH', help='play back a replay file')
+arg_parser.add_argument('--level', help='skip the menu and start at this level')
+arg_parser.add_argument('--seed', type=int, help='seed for the random module')
+arg_parser.add_argument('--headless', action='store_true', help='run without a window or audio and without frame limiting')
+arg_parser.add_argument('--ticks', type=int, help='quit after this many frames')
+arg_parser.add_argument('--bench-out', metavar='PATH', help='write frame timing results as JSON on exit')
+arg_parser.add_argument('--profile', action='store_true', help='start with the profiler overlay visible (toggle with F3)')
+arg_parser.add_argument('--quality', choices=quality_m.QUALITY_LEVELS, help='quality preset for this run, disables automatic level of detail')
+arg_parser.add_argument('--history', choices=['jsonl', 'sqlite'], default='jsonl', help='session history backend, sqlite also keeps leaderboard indexes')
+arg_parser.add_argument('--measure-startup', action='store_true', help='print a timed breakdown of the launch up to the first presented frame')
+arg_parser.add_argument('--trace', metavar='PATH', default=os.environ.get('WS_TRACE'), help='record frame stage timings as a Chrome trace (also WS_TRACE)')
+args = arg_parser.parse_args()
+startup = profiler_m.StartupTimer(STARTUP_START)
+startup.mark('imports')
+
+if args.headless:
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+# Replays: la semilla y el input por tick reproducen la partida exacta
+recording = None
+if args.replay:
+    active_replay = replay_m.load_replay(args.replay)
+    random.seed(active_replay.seed)
+    start_level = active_replay.level
+    inputs = replay_m.ReplayInput(active_replay)
+else:
+    start_level = args.level
+    if args.record or (args.seed is not None):
+        seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+        random.seed(seed)
+        if args.record:
+            recording = replay_m.Replay(seed, start_level)
+    inputs = replay_m.LiveInput(recording)
+
+# Calidad: preset de data/settings.json (o --quality). El LOD automático solo corre en
+# partidas normales, en replays y benchmarks el preset queda fijo para que sean reproducibles
+quality_config = quality_m.load_config(SETTINGS_FILE)
+if args.replay:
+    quality = quality_m.QualityController(active_replay.quality, auto=False)
+elif args.quality:
+    quality = quality_m.QualityController(args.quality, auto=False)
+else:
+    quality = quality_m.QualityController(quality_config['quality'], quality_config['auto_quality'] and not (recording or args.bench_out))
+if recording:
+    recording.quality = quality.level
+
+# Profiler por etapas del frame; F3 muestra el overlay
+show_profiler = args.profile
+profiler_required = bool(args.bench_out or args.trace)
+tracer = trace_m.TraceWriter(args.trace) if args.trace else None
+profiler = profiler_m.Profiler(enabled=profiler_required or show_profiler, keep_all=bool(args.bench_out), tracer=tracer)
+frame_count = 0
 
 # Try to initialize audio, if fails use dummy driver
 audio_enabled = True
@@ -33,11 +109,22 @@ except:
     pygame.init()
     audio_enabled = False
     print("Audio not available - running in silent mode")
+startup.mark('pygame init')
 pygame.display.set_caption('NetGuardian - The Last Firewall')
-screen = pygame.display.set_mode((900, 600), pygame.SCALED + pygame.RESIZABLE)
+# la ventana usa el tamaño lógico del frame y SDL hace el escalado
+screen = pygame.display.set_mode((300, 200), pygame.SCALED + pygame.RESIZABLE)
 pygame.mouse.set_visible(True)
 display = pygame.Surface((300, 200))
+presenter = Presenter(screen, display)
 clock = pygame.time.Clock()
+startup.mark('display')
+
+# ============= CARGA DE ASSETS =============
+# los grupos de assets se decodifican en paralelo, convert() se hace en el hilo principal
+# cuando cada loader recoge su imagen. antes del primer frame del menú solo se cargan las
+# fuentes, lo del juego se carga en segundo plano (ver load_gameplay_assets)
+asset_loader = asset_loader_m.AssetLoader()
+asset_loader.images('fonts', asset_loader_m.asset_files('data/fonts', 'png'))
 
 # ============= COLORES CIBERSEGURIDAD =============
 CYBER_COLORS = {
@@ -48,6 +135,46 @@ CYBER_COLORS = {
     'danger': (255, 50, 50),
     'bg_dark': (10, 10, 25),
 }
+# color transparente de la capa de contenido del menú, ningún elemento lo usa
+CONTENT_KEY = (255, 0, 255)
+
+# ============= ILUMINACIÓN =============
+# intensidad de todos los brillos, la resolución del light map la fija el preset de calidad
+LIGHTING = {'intensity': 1.0}
+
+# ============= SONIDO =============
+# cada categoría tiene sus propios canales reservados. steal: un sonido nuevo corta al más
+# viejo de la categoría cuando están todos ocupados, si no el sonido nuevo se descarta
+SOUND_CATEGORIES = {
+    'enemy': {'channels': 3, 'steal': False},
+    'player': {'channels': 2, 'steal': True},
+    'ui': {'channels': 1, 'steal': True},
+    'sfx': {'channels': 3, 'steal': True},
+    # los dos canales de la música, uno entra mientras el otro se apaga
+    'music': {'channels': 2, 'steal': True},
+}
+# interval: ms mínimos entre dos disparos del mismo sonido, los que llegan antes se ignoran
+# (eye_shoot sale cada 3 frames en la espiral del nivel 3, thought con cada letra)
+SOUNDS = {
+    'eye_shoot': {'category': 'enemy', 'volume': 0.7, 'interval': 90},
+    'eye_shoot_large': {'category': 'enemy', 'volume': 1.0, 'interval': 90},
+    'jump': {'category': 'player', 'volume': 0.3, 'interval': 0},
+    'death': {'category': 'player', 'volume': 1.0, 'interval': 0},
+    'enter_soul': {'category': 'player', 'volume': 1.0, 'interval': 0},
+    'exit_soul': {'category': 'player', 'volume': 1.0, 'interval': 0},
+    'thought': {'category': 'ui', 'volume': 1.0, 'interval': 60},
+    'mana_1': {'category': 'sfx', 'volume': 1.0, 'interval': 30},
+    'mana_2': {'category': 'sfx', 'volume': 1.0, 'interval': 30},
+}
+DEFAULT_MUSIC = 'data/music_1.wav'
+LEVEL_MUSIC = {'level_3': 'data/music_2.wav'}
+
+# ============= CALIDAD =============
+QUALITY_LABELS = {
+    'low': 'CALIDAD BAJA',
+    'medium': 'CALIDAD MEDIA',
+    'high': 'CALIDAD ALTA',
+}
 
 # ============= MENSAJES CIBERSEGURIDAD =============
 CYBER_MESSAGES = {
@@ -135,8 +262,10 @@ LEVEL_OBJECTIVES = {
 
 # ============= SISTEMA DE HISTORIAL =============
 class GameHistory:
-    def __init__(self):
-        self.history_file = 'data/game_history.json'
+    def __init__(self, backend='jsonl', persist=True):
+        self.backend = backend
+        self.history_file = history_store.HISTORY_PATH
+        self.legacy_file = history_store.LEGACY_PATH
         self.current_session = {
             'player_name': '',
             'start_time': 0,
@@ -144,24 +273,43 @@ class GameHistory:
             'firewalls_collected': 0,
             'breaches': 0
         }
+        # las repeticiones no guardan sesiones ni crean archivos de historial
+        self.persist = persist
         self.load_history()
+        # la escritura va a un hilo aparte, terminar una sesion no espera al disco
+        self.writer = history_writer.HistoryWriter(self.history)
     
     def load_history(self):
+        # sin persistencia no se abre la base: crearia el archivo (y los de WAL) e importaria
+        # todo el historial, el registro JSONL se puede leer sin escribir nada
+        if (self.backend == 'sqlite') and self.persist:
+            self.history = history_db.HistoryDB()
+            if not self.history.created:
+                return
+            # una base nueva importa el historial existente (registro JSONL o lista antigua)
+            try:
+                history_db.migrate(self.history, [self.history_file, self.legacy_file])
+                return
+            except Exception as e:
+                print(f"Error convirtiendo historial: {e}")
+            # la base queda sin migrar y se reintenta en el próximo inicio; mientras, las
+            # sesiones van al registro JSONL, que es lo primero que importa
+            self.history.close()
+        # sin registro JSONL se lee el historial antiguo, la primera sesion guardada lo convierte
+        self.history = history_store.HistoryLog(self.history_file, self.legacy_file)
+    
+    def save_history(self, session_data):
+        if not self.persist:
+            return
         try:
-            with open(self.history_file, 'r', encoding='utf-8') as f:
-                self.history = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.history = []
-            os.makedirs('data', exist_ok=True)
-    
-    def save_history(self):
-        try:
-            os.makedirs('data', exist_ok=True)
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, indent=2, ensure_ascii=False)
+            self.writer.append(session_data)
         except Exception as e:
             print(f"Error guardando historial: {e}")
     
+    # espera a que las sesiones pendientes esten escritas, antes de salir
+    def flush(self):
+        self.writer.flush()
+    
     def start_session(self, player_name):
         self.current_session = {
             'player_name': player_name,
@@ -169,7 +317,8 @@ class GameHistory:
             'threats_neutralized': 0,
             'firewalls_collected': 0,
             'breaches': 0,
-            'levels_completed': []
+            'levels_completed': [],
+            'clear_times': {}
         }
     
     def end_session(self, final_level):
@@ -186,11 +335,11 @@ class GameHistory:
             'firewalls_collected': self.current_session['firewalls_collected'],
             'breaches': self.current_session['breaches'],
             'final_level': final_level,
-            'levels_completed': self.current_session['levels_completed']
+            'levels_completed': self.current_session['levels_completed'],
+            'clear_times': self.current_session['clear_times']
         }
         
-        self.history.append(session_data)
-        self.save_history()
+        self.save_history(session_data)
     
     def format_duration(self, seconds):
         hours = int(seconds // 3600)
@@ -215,6 +364,9 @@ class GameHistory:
     def add_level_completed(self, level_name):
         if level_name not in self.current_session['levels_completed']:
             self.current_session['levels_completed'].append(level_name)
+            # segundos desde el inicio de la sesion, para el ranking de niveles mas rapidos
+            start_time = datetime.datetime.fromisoformat(self.current_session['start_time'])
+            self.current_session['clear_times'][level_name] = int((datetime.datetime.now() - start_time).total_seconds())
 
 
 # ============= SISTEMA DE MENÚ =============
@@ -258,7 +410,7 @@ class VolumeControl:
         self.y = y
         self.font = font
         try:
-            self.volume = pygame.mixer.music.get_volume()
+            self.volume = music.volume
         except:
             self.volume = 0.5
         self.plus_button = Button(x + 50, y, 20, 20, '+', font)
@@ -277,7 +429,7 @@ class VolumeControl:
         if self.plus_button.check_click(mouse_pos, mouse_pressed):
             self.volume = min(1.0, self.volume + 0.1)
             try:
-                pygame.mixer.music.set_volume(self.volume)
+                music.set_volume(self.volume)
             except:
                 pass
             return True
@@ -285,7 +437,7 @@ class VolumeControl:
         if self.minus_button.check_click(mouse_pos, mouse_pressed):
             self.volume = max(0.0, self.volume - 0.1)
             try:
-                pygame.mixer.music.set_volume(self.volume)
+                music.set_volume(self.volume)
             except:
                 pass
             return True
@@ -317,7 +469,7 @@ class InputBox:
                 if char.isprintable() and (char.isalnum() or char == ' '):
                     self.text += char
     
-    def draw(self, surface, game_time):
+    def draw(self, surface):
         color = (30, 60, 90) if self.active else (20, 40, 60)
         pygame.draw.rect(surface, color, self.rect)
         pygame.draw.rect(surface, CYBER_COLORS['primary_cyan'], self.rect, 2)
@@ -327,11 +479,17 @@ class InputBox:
         
         temp_font = text.Font('data/fonts/small_font.png', text_color)
         temp_font.render(display_text, surface, (self.rect.x + 5, self.rect.y + 5))
-        
-        if self.active and game_time % 30 < 15:
-            cursor_x = self.rect.x + 5 + self.font.width(self.text)
-            pygame.draw.rect(surface, CYBER_COLORS['primary_green'], 
-                           (cursor_x, self.rect.y + 5, 2, 10))
+    
+    def cursor_visible(self, game_time):
+        return self.active and game_time % 30 < 15
+    
+    def cursor_rect(self):
+        cursor_x = self.rect.x + 5 + self.font.width(self.text)
+        return pygame.Rect(cursor_x, self.rect.y + 5, 2, 10)
+    
+    def draw_cursor(self, surface, game_time):
+        if self.cursor_visible(game_time):
+            pygame.draw.rect(surface, CYBER_COLORS['primary_green'], self.cursor_rect())
 
 
 class MenuState:
@@ -342,11 +500,11 @@ class MenuState:
 
 
 class GameMenu:
-    def __init__(self, display, font):
+    def __init__(self, display, font, history_backend='jsonl', persist_history=True):
         self.display = display
         self.font = font
         self.state = MenuState.MAIN
-        self.history = GameHistory()
+        self.history = GameHistory(history_backend, persist_history)
         
         center_x = display.get_width() // 2
         button_width = 120
@@ -360,6 +518,7 @@ class GameMenu:
                                   button_width, button_height, 'SALIR', font)
         
         self.volume_control = VolumeControl(display.get_width() - 80, 10, font)
+        self.quality_button = Button(10, 10, 80, 20, '', font)
         self.name_input = InputBox(center_x - 70, 100, 140, 20, font)
         self.confirm_button = Button(center_x - 40, 130, 80, 20, 'CONECTAR', font)
         self.back_button = Button(10, display.get_height() - 30, 60, 20, 'VOLVER', font)
@@ -367,56 +526,88 @@ class GameMenu:
         self.history_scroll = 0
         self.max_history_display = 8
         self.clicked_last_frame = False
-    
-    def render_cyber_background(self, game_time):
-        self.display.fill(CYBER_COLORS['bg_dark'])
-        
-        grid_color = (0, 50, 80)
-        for x in range(0, self.display.get_width(), 20):
-            alpha = abs(math.sin(game_time * 0.01 + x * 0.1))
-            if alpha > 0.5:
-                pygame.draw.line(self.display, grid_color, (x, 0), (x, self.display.get_height()), 1)
-        
-        for y in range(0, self.display.get_height(), 20):
-            alpha = abs(math.sin(game_time * 0.01 + y * 0.1))
-            if alpha > 0.5:
-                pygame.draw.line(self.display, grid_color, (0, y), (self.display.get_width(), y), 1)
-    
-    def draw_main_menu(self, game_time):
-        self.render_cyber_background(game_time)
         
-        title = 'NETGUARDIAN'
-        title_x = self.display.get_width() // 2 - self.font.width(title) // 2
-        
-        glitch_offset = random.randint(-1, 1) if game_time % 60 < 2 else 0
-        
-        black_font = text.Font('data/fonts/small_font.png', (0, 0, 1))
-        cyan_font = text.Font('data/fonts/small_font.png', CYBER_COLORS['primary_cyan'])
-        green_font = text.Font('data/fonts/small_font.png', CYBER_COLORS['primary_green'])
-        
-        black_font.render(title, self.display, (title_x + 1, 31))
-        cyan_font.render(title, self.display, (title_x + glitch_offset, 30))
-        green_font.render(title, self.display, (title_x, 29))
+        # Renderizado por rectángulos sucios: la parte estática de cada pantalla (textos,
+        # botones) se dibuja en content_surf y solo se rehace cuando cambia su firma (estado,
+        # hover, texto). static_surf es el grid con content_surf encima; cuando parpadea
+        # una línea del grid solo se recompone y se actualiza ese rectángulo. Los elementos
+        # animados se repintan sobre ella cuando cambian y solo sus rectángulos terminan en
+        # dirty_rects para pygame.display.update(rects)
+        self.background = BackgroundRenderer(display.get_size(), CYBER_COLORS['bg_dark'], (0, 50, 80), (10, 15, 30), (0, 5, 10))
+        self.static_surf = pygame.Surface(display.get_size())
+        self.content_surf = pygame.Surface(display.get_size())
+        self.content_surf.set_colorkey(CONTENT_KEY)
+        self.static_key = None
+        self.static_grid = None
+        self.anim_keys = {}
+        self.dirty_rects = []
+        self.fonts = {}
+    
+    def colored_font(self, color):
+        if color not in self.fonts:
+            self.fonts[color] = text.Font('data/fonts/small_font.png', color)
+        return self.fonts[color]
+    
+    # fuerza un redibujado completo en el siguiente frame
+    def invalidate(self):
+        self.static_key = None
+    
+    # el grid no va en la capa de contenido, compose_static lo pone debajo
+    def render_cyber_background(self, surf, game_time):
+        surf.fill(CONTENT_KEY)
+    
+    def compose_static(self, game_time, area=None):
+        self.background.render_base(self.static_surf, self.grid_time(game_time), area)
+        if area:
+            self.static_surf.blit(self.content_surf, area, area)
+        else:
+            self.static_surf.blit(self.content_surf, (0, 0))
+    
+    def grid_time(self, game_time):
+        # el historial usa el grid quieto
+        return 0 if self.state == MenuState.HISTORY else game_time
+    
+    def static_signature(self, game_time):
+        buttons = [self.start_button, self.history_button, self.exit_button, self.confirm_button, self.back_button,
+                   self.volume_control.plus_button, self.volume_control.minus_button, self.quality_button]
+        return (
+            self.state,
+            tuple(button.hovered for button in buttons),
+            self.volume_control.volume,
+            self.quality_button.text,
+            self.name_input.text,
+            self.name_input.active,
+            self.history_scroll,
+            # el total solo se cuenta con la pantalla de historial abierta
+            self.history.history.count() if self.state == MenuState.HISTORY else None,
+        )
+    
+    def draw_main_menu(self, surf, game_time):
+        self.render_cyber_background(surf, game_time)
         
         subtitle = 'THE LAST FIREWALL'
         sub_x = self.display.get_width() // 2 - self.font.width(subtitle) // 2
-        small_font = text.Font('data/fonts/small_font.png', CYBER_COLORS['primary_cyan'])
-        small_font.render(subtitle, self.display, (sub_x, 45))
+        self.colored_font(CYBER_COLORS['primary_cyan']).render(subtitle, surf, (sub_x, 45))
         
-        for i in range(3):
-            x = title_x + i * 60 + 10
-            y = 60 + math.sin(game_time * 0.1 + i) * 3
-            self.render_firewall_icon([x, y], game_time + i * 20)
-        
-        self.start_button.draw(self.display)
-        self.history_button.draw(self.display)
-        self.exit_button.draw(self.display)
-        self.volume_control.draw(self.display)
+        self.start_button.draw(surf)
+        self.history_button.draw(surf)
+        self.exit_button.draw(surf)
+        self.quality_button.draw(surf)
+        self.volume_control.draw(surf)
         
         instructions = '> Flechas para navegar'
         inst_x = self.display.get_width() // 2 - self.font.width(instructions) // 2
-        inst_font = text.Font('data/fonts/small_font.png', (100, 150, 100))
-        inst_font.render(instructions, self.display, (inst_x, self.display.get_height() - 20))
+        self.colored_font((100, 150, 100)).render(instructions, surf, (inst_x, self.display.get_height() - 20))
+    
+    def title_x(self):
+        return self.display.get_width() // 2 - self.font.width('NETGUARDIAN') // 2
+    
+    def draw_title(self, glitch_offset):
+        title = 'NETGUARDIAN'
+        title_x = self.title_x()
+        self.colored_font((0, 0, 1)).render(title, self.display, (title_x + 1, 31))
+        self.colored_font(CYBER_COLORS['primary_cyan']).render(title, self.display, (title_x + glitch_offset, 30))
+        self.colored_font(CYBER_COLORS['primary_green']).render(title, self.display, (title_x, 29))
     
     def render_firewall_icon(self, pos, offset):
         points = []
@@ -430,43 +621,42 @@ class GameMenu:
         pygame.draw.polygon(self.display, CYBER_COLORS['primary_green'], points, 1)
         pygame.draw.circle(self.display, CYBER_COLORS['primary_cyan'], (int(pos[0]), int(pos[1])), 2, 1)
     
-    def draw_name_input(self, game_time):
-        self.render_cyber_background(game_time)
+    def draw_name_input(self, surf, game_time):
+        self.render_cyber_background(surf, game_time)
         
         prompt = 'ID DE USUARIO:'
         prompt_x = self.display.get_width() // 2 - self.font.width(prompt) // 2
-        cyan_font = text.Font('data/fonts/small_font.png', CYBER_COLORS['primary_cyan'])
-        cyan_font.render(prompt, self.display, (prompt_x, 70))
+        self.colored_font(CYBER_COLORS['primary_cyan']).render(prompt, surf, (prompt_x, 70))
         
-        self.name_input.draw(self.display, game_time)
+        self.name_input.draw(surf)
         
         if self.name_input.text:
-            self.confirm_button.draw(self.display)
+            self.confirm_button.draw(surf)
     
-    def draw_history(self):
-        self.render_cyber_background(0)
+    def draw_history(self, surf):
+        self.render_cyber_background(surf, 0)
         
         title = 'HISTORIAL DE SESIONES'
         title_x = self.display.get_width() // 2 - self.font.width(title) // 2
-        cyan_font = text.Font('data/fonts/small_font.png', CYBER_COLORS['primary_cyan'])
-        cyan_font.render(title, self.display, (title_x, 10))
+        self.colored_font(CYBER_COLORS['primary_cyan']).render(title, surf, (title_x, 10))
         
-        pygame.draw.line(self.display, CYBER_COLORS['primary_cyan'], 
+        pygame.draw.line(surf, CYBER_COLORS['primary_cyan'],
                         (10, 25), (self.display.get_width() - 10, 25), 1)
         
-        if not self.history.history:
+        if not self.history.history.count():
             no_data = 'SIN REGISTROS'
             no_data_x = self.display.get_width() // 2 - self.font.width(no_data) // 2
-            green_font = text.Font('data/fonts/small_font.png', CYBER_COLORS['primary_green'])
-            green_font.render(no_data, self.display, (no_data_x, 100))
+            self.colored_font(CYBER_COLORS['primary_green']).render(no_data, surf, (no_data_x, 100))
         else:
             y_offset = 35
-            visible_history = self.history.history[self.history_scroll:
-                                                   self.history_scroll + self.max_history_display]
+            # las sesiones mas recientes primero, leidas desde el final del registro
+            visible_history = self.history.history.recent(self.history_scroll, self.max_history_display)
             
+            data_font = self.colored_font(CYBER_COLORS['primary_green'])
+            date_font = self.colored_font((80, 120, 120))
             for i, session in enumerate(visible_history):
                 if i % 2 == 0:
-                    pygame.draw.rect(self.display, (15, 25, 35), 
+                    pygame.draw.rect(surf, (15, 25, 35),
                                    (5, y_offset - 2, self.display.get_width() - 10, 18))
                 
                 player_name = session['player_name'][:12]
@@ -476,52 +666,111 @@ class GameMenu:
                 threats = session.get('threats_neutralized', session.get('enemies_defeated', 0))
                 threats = str(threats)
                 
-                data_font = text.Font('data/fonts/small_font.png', CYBER_COLORS['primary_green'])
-                
-                data_font.render(f'{player_name}', self.display, (10, y_offset))
-                data_font.render(f'{duration}', self.display, (100, y_offset))
-                data_font.render(f'T:{threats}', self.display, (170, y_offset))
+                data_font.render(f'{player_name}', surf, (10, y_offset))
+                data_font.render(f'{duration}', surf, (100, y_offset))
+                data_font.render(f'T:{threats}', surf, (170, y_offset))
                 
-                date_font = text.Font('data/fonts/small_font.png', (80, 120, 120))
-                date_font.render(session['date'][11:16], self.display, (220, y_offset))
+                date_font.render(session['date'][11:16], surf, (220, y_offset))
                 
                 y_offset += 18
             
-            if len(self.history.history) > self.max_history_display:
-                scroll_text = f'{self.history_scroll + 1}-{min(self.history_scroll + self.max_history_display, len(self.history.history))} / {len(self.history.history)}'
+            total = self.history.history.count()
+            if total > self.max_history_display:
+                scroll_text = f'{self.history_scroll + 1}-{min(self.history_scroll + self.max_history_display, total)} / {total}'
                 scroll_x = self.display.get_width() // 2 - self.font.width(scroll_text) // 2
-                small_font = text.Font('data/fonts/small_font.png', (80, 100, 100))
-                small_font.render(scroll_text, self.display, (scroll_x, y_offset + 5))
+                self.colored_font((80, 100, 100)).render(scroll_text, surf, (scroll_x, y_offset + 5))
         
-        self.back_button.draw(self.display)
+        self.back_button.draw(surf)
     
-    def draw_story(self, game_time):
-        self.render_cyber_background(game_time)
-        
+    # recorre la historia en orden; las líneas '[...]' son animadas y se saltan en la capa estática
+    def story_lines(self):
         y_offset = 15
         for line in GAME_STORY['intro']:
             if line == '':
                 y_offset += 8
-            elif line.startswith('ANO') or line.startswith('TU MISION') or line.startswith('HERRAMIENTAS'):
-                cyan_font = text.Font('data/fonts/small_font.png', CYBER_COLORS['primary_cyan'])
-                line_x = self.display.get_width() // 2 - self.font.width(line) // 2
-                cyan_font.render(line, self.display, (line_x, y_offset))
-                y_offset += 12
-            elif line.startswith('['):
-                green_font = text.Font('data/fonts/small_font.png', CYBER_COLORS['primary_green'])
-                line_x = self.display.get_width() // 2 - self.font.width(line) // 2
-                glow = abs(math.sin(game_time * 0.1)) * 20
-                glow_color = (0, int(255 - glow), int(100 + glow))
-                glow_font = text.Font('data/fonts/small_font.png', glow_color)
-                glow_font.render(line, self.display, (line_x, y_offset))
+                continue
+            line_x = self.display.get_width() // 2 - self.font.width(line) // 2
+            yield line, line_x, y_offset
+            if line.startswith('ANO') or line.startswith('TU MISION') or line.startswith('HERRAMIENTAS') or line.startswith('['):
                 y_offset += 12
             else:
-                white_font = text.Font('data/fonts/small_font.png', (200, 200, 200))
-                line_x = self.display.get_width() // 2 - self.font.width(line) // 2
-                white_font.render(line, self.display, (line_x, y_offset))
                 y_offset += 10
     
+    def draw_story(self, surf, game_time):
+        self.render_cyber_background(surf, game_time)
+        
+        for line, line_x, y_offset in self.story_lines():
+            if line.startswith('ANO') or line.startswith('TU MISION') or line.startswith('HERRAMIENTAS'):
+                self.colored_font(CYBER_COLORS['primary_cyan']).render(line, surf, (line_x, y_offset))
+            elif not line.startswith('['):
+                self.colored_font((200, 200, 200)).render(line, surf, (line_x, y_offset))
+    
+    def draw_static(self, game_time):
+        if self.state == MenuState.MAIN:
+            self.draw_main_menu(self.content_surf, game_time)
+        elif self.state == MenuState.STORY:
+            self.draw_story(self.content_surf, game_time)
+        elif self.state == MenuState.NAME_INPUT:
+            self.draw_name_input(self.content_surf, game_time)
+        elif self.state == MenuState.HISTORY:
+            self.draw_history(self.content_surf)
+    
+    # elementos animados de la pantalla actual: (nombre, rect, clave, función de dibujo).
+    # solo se repintan cuando su clave cambia respecto al frame anterior
+    def animated_elements(self, game_time):
+        elements = []
+        if self.state == MenuState.MAIN:
+            glitch_offset = random.randint(-1, 1) if game_time % 60 < 2 else 0
+            title_x = self.title_x()
+            elements.append(('title', pygame.Rect(title_x - 1, 29, self.font.width('NETGUARDIAN') + 3, 11),
+                             glitch_offset, lambda: self.draw_title(glitch_offset)))
+            for i in range(3):
+                x = title_x + i * 60 + 10
+                y = 60 + math.sin(game_time * 0.1 + i) * 3
+                elements.append(('icon_' + str(i), pygame.Rect(int(x) - 6, 50, 14, 21), game_time,
+                                 lambda x=x, y=y, i=i: self.render_firewall_icon([x, y], game_time + i * 20)))
+        elif self.state == MenuState.STORY:
+            for line, line_x, y_offset in self.story_lines():
+                if line.startswith('['):
+                    glow = abs(math.sin(game_time * 0.1)) * 20
+                    glow_color = (0, int(255 - glow), int(100 + glow))
+                    elements.append((line, pygame.Rect(line_x, y_offset, self.font.width(line), 8), glow_color,
+                                     lambda line=line, pos=(line_x, y_offset), color=glow_color: self.colored_font(color).render(line, self.display, pos)))
+        elif self.state == MenuState.NAME_INPUT:
+            elements.append(('cursor', self.name_input.cursor_rect(), self.name_input.cursor_visible(game_time),
+                             lambda: self.name_input.draw_cursor(self.display, game_time)))
+        return elements
+    
+    def draw(self, game_time):
+        key = self.static_signature(game_time)
+        grid = self.background.grid_lines(self.grid_time(game_time))
+        changed = []
+        if key != self.static_key:
+            self.static_key = key
+            self.static_grid = grid
+            self.anim_keys = {}
+            self.draw_static(game_time)
+            self.compose_static(game_time)
+            self.display.blit(self.static_surf, (0, 0))
+            self.dirty_rects.append(self.display.get_rect())
+        elif grid != self.static_grid:
+            # el grid parpadea por líneas: solo se recomponen las que cambiaron
+            changed = self.background.changed_lines(self.static_grid, grid)
+            self.static_grid = grid
+            for rect in changed:
+                self.compose_static(game_time, rect)
+                self.display.blit(self.static_surf, rect, rect)
+                self.dirty_rects.append(rect)
+        
+        for name, rect, anim_key, draw_func in self.animated_elements(game_time):
+            if (self.anim_keys.get(name) != anim_key) or (rect.collidelist(changed) != -1):
+                self.anim_keys[name] = anim_key
+                self.display.blit(self.static_surf, rect, rect)
+                draw_func()
+                self.dirty_rects.append(rect)
+    
     def update(self, game_time, events, mouse_pos, mouse_pressed):
+        self.dirty_rects = []
         single_click = mouse_pressed and not self.clicked_last_frame
         self.clicked_last_frame = mouse_pressed
         
@@ -531,6 +780,7 @@ class GameMenu:
             self.start_button.check_hover(mouse_pos)
             self.history_button.check_hover(mouse_pos)
             self.exit_button.check_hover(mouse_pos)
+            self.quality_button.check_hover(mouse_pos)
             
             if self.start_button.check_click(mouse_pos, single_click):
                 self.state = MenuState.STORY
@@ -544,15 +794,14 @@ class GameMenu:
             if self.exit_button.check_click(mouse_pos, single_click):
                 return 'exit'
             
-            self.draw_main_menu(game_time)
+            if self.quality_button.check_click(mouse_pos, single_click):
+                return 'quality'
         
         elif self.state == MenuState.STORY:
             for event in events:
                 if event.type == KEYDOWN and event.key == K_SPACE:
                     self.state = MenuState.NAME_INPUT
                     return 'name_input'
-            
-            self.draw_story(game_time)
         
         elif self.state == MenuState.NAME_INPUT:
             for event in events:
@@ -565,8 +814,6 @@ class GameMenu:
                 self.history.start_session(player_name)
                 self.name_input.text = ''
                 return 'start_game'
-            
-            self.draw_name_input(game_time)
         
         elif self.state == MenuState.HISTORY:
             self.back_button.check_hover(mouse_pos)
@@ -578,12 +825,11 @@ class GameMenu:
             for event in events:
                 if event.type == pygame.MOUSEWHEEL:
                     self.history_scroll = max(0, min(
-                        len(self.history.history) - self.max_history_display,
+                        self.history.history.count() - self.max_history_display,
                         self.history_scroll - event.y
                     ))
-            
-            self.draw_history()
         
+        self.draw(game_time)
         return None
 
 
@@ -1202,7 +1448,6 @@ def render_cyber_hud(player_firewall, level_time):
 
 
 # ============= JUEGO ORIGINAL CON TEMA CYBER =============
-spritesheets, spritesheets_data = spritesheet_loader.load_spritesheets('data/images/tilesets/')
 level_map = tile_map.TileMap((TILE_SIZE, TILE_SIZE), (300, 200))
 level_name = 'level_1'
 
@@ -1313,40 +1558,39 @@ ids_system = IntrusionDetectionSystem()
 traffic_analyzer = NetworkTrafficAnalyzer()
 firewall_stack = FirewallRuleStack()
 
-# Load sounds with fallback for environments without audio
-try:
-    sounds = {k.split('.')[0]: pygame.mixer.Sound('data/sfx/' + k) for k in os.listdir('data/sfx')}
-    sounds['eye_shoot'].set_volume(0.7)
-    sounds['jump'].set_volume(0.3)
-except:
-    # Create empty sound dictionary if audio not available
-    sounds = {k.split('.')[0]: None for k in os.listdir('data/sfx')}
+sound_bank = SoundBank(SOUND_CATEGORIES, SOUNDS)
+# la música se decodifica en otro hilo y cambia con un crossfade, sin abrir archivos en un frame
+music = music_m.MusicController(sound_bank.pools.get('music', []), audio_enabled)
+
+def level_music(name):
+    return LEVEL_MUSIC.get(name, DEFAULT_MUSIC)
+
+def following_level(name):
+    return name.split('_')[0] + '_' + str(int(name.split('_')[-1]) + 1)
 
 def play_sound(sound_name):
     """Safely play a sound, handling cases where audio is not available"""
-    if sound_name in sounds and sounds[sound_name] is not None:
-        try:
-            sounds[sound_name].play()
-        except:
-            pass
-
-def play_music(music_file, loops=-1):
-    """Safely play music, handling cases where audio is not available"""
     try:
-        pygame.mixer.music.load(music_file)
-        pygame.mixer.music.play(loops)
+        sound_bank.play(sound_name)
     except:
         pass
 
-def fadeout_music(time_ms):
-    """Safely fadeout music, handling cases where audio is not available"""
+def play_music(music_file, fade_ms=music_m.CROSSFADE_MS):
+    """Safely play music, handling cases where audio is not available"""
     try:
-        pygame.mixer.music.fadeout(time_ms)
+        music.play(music_file, fade_ms)
     except:
         pass
 
 def reload_level(restart_audio=True):
-    global player, projectiles, particles, scroll_target, events, soul_mode, level_time, player_mana, level_map, player_message, zoom, death, next_level, door, ready_to_exit, tutorial, tutorial_2, true_scroll, npcs, current_puzzle, puzzle_input_active, puzzle_user_input, current_packet_game, ids_system, traffic_analyzer, firewall_stack, show_level_objectives, objectives_dismissed
+    global player, soul, projectiles, particles, scroll_target, events, soul_mode, level_time, player_mana, level_map, player_message, zoom, death, next_level, door, ready_to_exit, tutorial, tutorial_2, true_scroll, npcs, current_puzzle, puzzle_input_active, puzzle_user_input, current_packet_game, ids_system, traffic_analyzer, firewall_stack, show_level_objectives, objectives_dismissed
+    profiler.instant('reload_level', level=level_name)
+    finish_loading()
+    if not player:
+        # su animación idle sale de las imágenes que ya decodificó la carga, no del menú
+        player = Entity(animations, level_spawns[level_name], (7, 13), 'player')
+        soul = Entity(animations, level_spawns[level_name], (7, 13), 'soul')
+        soul.offset = [-1, -1]
     level_map.load_map(level_name + '.json')
     player.pos = level_spawns[level_name].copy()
     soul.pos = level_spawns[level_name].copy()
@@ -1404,10 +1648,7 @@ def reload_level(restart_audio=True):
         door = None
 
     if restart_audio:
-        if level_name == 'level_3':
-            play_music('data/music_2.wav')
-        else:
-            play_music('data/music_1.wav')
+        play_music(level_music(level_name))
 
 def advance(pos, rot, amt):
     pos[0] += math.cos(rot) * amt
@@ -1420,37 +1661,94 @@ def particle_burst(loc, amt):
         angle = random.randint(1, 360)
         speed = random.randint(20, 80) / 10
         vel = [math.cos(angle) * speed, math.sin(angle) * speed]
-        particles.append(particles_m.Particle(loc[0], loc[1], 'light', vel, 0.8, 2 + random.randint(0, 20) / 10, custom_color=CYBER_COLORS['primary_cyan']))
+        if quality.keep('particles'):
+            particles.append(particles_m.Particle(loc[0], loc[1], 'light', vel, 0.8, 2 + random.randint(0, 20) / 10, custom_color=CYBER_COLORS['primary_cyan']))
 
 animations = anim_loader.AnimationManager()
 
-proj_img = pygame.image.load('data/images/projectile.png').convert()
-proj_img.set_colorkey((0, 0, 0))
-door_img = pygame.image.load('data/images/door.png').convert()
-door_img.set_colorkey((0, 0, 0))
-
 projectiles = []
-
-particles_m.load_particle_images('data/images/particles')
 particles = []
-
 sparks = []
 
-font = text.Font('data/fonts/small_font.png', CYBER_COLORS['primary_green'])
-blue_font = text.Font('data/fonts/small_font.png', CYBER_COLORS['primary_cyan'])
-red_font = text.Font('data/fonts/small_font.png', CYBER_COLORS['danger'])
-black_font = text.Font('data/fonts/small_font.png', (0, 0, 1))
-
-player = Entity(animations, level_spawns[level_name], (7, 13), 'player')
-soul = Entity(animations, level_spawns[level_name], (7, 13), 'soul')
+def apply_quality():
+    settings = quality.settings
+    background.set_detail(settings['fog_layers'], settings['back_waves'])
+    if light_map.quality != settings['lighting']:
+        light_map.set_quality(settings['lighting'])
+    light_map.max_lights = settings['max_glows']
+
+# ============= CARGA EN SEGUNDO PLANO =============
+# lo que solo usa el juego se carga en pasos cortos, uno por frame del menú (load_step), y
+# reload_level completa lo que falte con finish_loading antes de empezar un nivel
+def load_gameplay_assets():
+    global spritesheets, spritesheets_data, proj_img, door_img, background, light_map
+    asset_loader.images('tilesets', asset_loader_m.asset_files('data/images/tilesets', 'png'))
+    asset_loader.images('animations', [path for anim_id in GAMEPLAY_ANIMATIONS for path in asset_loader_m.asset_files(anim_loader.ANIMATION_PATH + '/' + anim_id, 'png')])
+    asset_loader.images('particles', asset_loader_m.asset_files('data/images/particles', 'png'))
+    asset_loader.images('images', ['data/images/projectile.png', 'data/images/door.png'])
+    # todos los efectos se decodifican mientras carga el juego (son pequeños), ninguno abre
+    # su archivo dentro de un frame; door suena justo en el frame de la transicion
+    sound_bank.preload(sorted(sound_bank.paths), asset_loader.submitter('sfx'))
+    yield
+    with asset_loader.finish('tilesets'):
+        spritesheets, spritesheets_data = spritesheet_loader.load_spritesheets('data/images/tilesets/')
+    yield
+    with asset_loader.finish('sfx'):
+        for name in sorted(sound_bank.paths):
+            sound_bank.get(name)
+    yield
+    with asset_loader.finish('images'):
+        proj_img = asset_cache.load_image('data/images/projectile.png').convert()
+        proj_img.set_colorkey((0, 0, 0))
+        door_img = asset_cache.load_image('data/images/door.png').convert()
+        door_img.set_colorkey((0, 0, 0))
+    with asset_loader.finish('particles'):
+        particles_m.load_particle_images('data/images/particles')
+    yield
+    background = BackgroundRenderer(display.get_size(), CYBER_COLORS['bg_dark'], (0, 50, 80), (10, 15, 30), (0, 5, 10))
+    light_map = LightMap(display.get_size(), quality.settings['lighting'], LIGHTING['intensity'])
+    yield
+    # las animaciones se decodifican antes de empezar el nivel y no en el primer salto
+    with asset_loader.finish('animations'):
+        animations.preload(GAMEPLAY_ANIMATIONS)
+    # en el último paso, así vale también un preset elegido en el menú durante la carga
+    apply_quality()
+    asset_loader.close()
+    if args.profile or args.measure_startup:
+        print(asset_loader.report())
+
+gameplay_loading = load_gameplay_assets()
+
+def load_step():
+    global gameplay_loading
+    if gameplay_loading and (next(gameplay_loading, 'done') == 'done'):
+        gameplay_loading = None
+
+def finish_loading():
+    global gameplay_loading
+    if gameplay_loading:
+        for step in gameplay_loading:
+            pass
+        gameplay_loading = None
+
+with asset_loader.finish('fonts'):
+    font = text.Font('data/fonts/small_font.png', CYBER_COLORS['primary_green'])
+    blue_font = text.Font('data/fonts/small_font.png', CYBER_COLORS['primary_cyan'])
+    red_font = text.Font('data/fonts/small_font.png', CYBER_COLORS['danger'])
+    black_font = text.Font('data/fonts/small_font.png', (0, 0, 1))
+startup.mark('fonts')
+
+# el jugador y el alma se crean en reload_level, con sus animaciones ya cargadas
+player = None
+soul = None
 player_mana = 1
-soul.offset = [-1, -1]
 player_velocity = [0, 0]
 air_timer = 0
 
-true_scroll = [player.center[0] - display.get_width() // 2, player.center[1] - display.get_height() // 2]
+# reload_level las sitúa sobre el jugador
+true_scroll = [0, 0]
 scroll = true_scroll.copy()
-scroll_target = player.pos
+scroll_target = None
 zoom = 1
 
 left = False
@@ -1503,11 +1801,75 @@ show_level_objectives = False
 objectives_dismissed = False
 
 # Inicializar menú
-game_menu = GameMenu(display, font)
+game_menu = GameMenu(display, font, args.history, not args.replay)
+game_menu.quality_button.text = QUALITY_LABELS[quality.target]
 game_state = 'menu'
 game_history = game_menu.history
-
-play_music('data/music_1.wav')
+startup.mark('menu')
+
+play_music(DEFAULT_MUSIC, 0)
+
+if start_level:
+    game_state = 'playing'
+    level_name = start_level
+    game_history.start_session(args.replay and active_replay.player_name or 'replay')
+    reload_level(True)
+    pygame.mouse.set_visible(False)
+    startup.mark('level')
+
+# el botón de calidad del menú recorre los presets y guarda la elección en data/settings.json
+def cycle_quality():
+    index = quality_m.QUALITY_LEVELS.index(quality.target)
+    level = quality_m.QUALITY_LEVELS[(index + 1) % len(quality_m.QUALITY_LEVELS)]
+    quality.select(level)
+    # si el juego todavía se está cargando, el último paso de la carga aplica el preset
+    if not gameplay_loading:
+        apply_quality()
+    game_menu.quality_button.text = QUALITY_LABELS[level]
+    if not args.replay:
+        quality_config['quality'] = level
+        quality_m.save_config(SETTINGS_FILE, quality_config)
+
+def write_bench_results(path):
+    try:
+        import resource
+        max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        max_rss_kb = None
+    results = {
+        'level': start_level,
+        'ticks': len(profiler.frames),
+        'stages': profiler.summary(),
+        'peaks': profiler.peaks,
+        'max_rss_kb': max_rss_kb,
+        'asset_load': asset_loader.summary(),
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+def startup_done():
+    global startup
+    startup.mark('first frame')
+    if args.measure_startup:
+        print(startup.report())
+    startup = None
+
+def toggle_profiler():
+    global show_profiler
+    show_profiler = not show_profiler
+    profiler.set_enabled(show_profiler or profiler_required)
+
+def quit_game():
+    game_history.flush()
+    if recording:
+        recording.save(args.record)
+    if args.bench_out:
+        write_bench_results(args.bench_out)
+    if tracer:
+        profiler.abort_frame()
+        tracer.close()
+    pygame.quit()
+    sys.exit()
 
 # Función para renderizar objetivos del nivel
 def render_level_objectives(current_level, game_time):
@@ -1563,16 +1925,27 @@ def render_level_objectives(current_level, game_time):
 
 while True:
     # MENÚ
+    frame_count += 1
+    if args.ticks and (frame_count > args.ticks):
+        quit_game()
+
+    music.update()
+
     if game_state == 'menu':
-        current_events = pygame.event.get()
+        profiler.start_frame()
+        profiler.stage('menu')
+        current_events = inputs.poll()
         for event in current_events:
             if event.type == QUIT:
-                pygame.quit()
-                sys.exit()
+                quit_game()
+            if event.type == KEYDOWN and event.key == K_F3:
+                toggle_profiler()
+            if event.type in (VIDEOEXPOSE, WINDOWEXPOSED):
+                game_menu.invalidate()
         
         menu_result = game_menu.update(game_time, current_events, 
-                                      pygame.mouse.get_pos(), 
-                                      pygame.mouse.get_pressed()[0])
+                                      inputs.mouse_pos, 
+                                      inputs.mouse_pressed)
         
         if menu_result == 'start_game':
             game_state = 'playing'
@@ -1580,17 +1953,36 @@ while True:
             reload_level(True)
             pygame.mouse.set_visible(False)
         elif menu_result == 'exit':
-            pygame.quit()
-            sys.exit()
-        
-        screen.blit(pygame.transform.scale(display, screen.get_size()), (0, 0))
-        pygame.display.update()
-        clock.tick(60)
+            quit_game()
+        elif menu_result == 'quality':
+            cycle_quality()
+        
+        if show_profiler:
+            profiler.stage('overlay')
+            profiler.render_overlay(display, font)
+            # el overlay pisa el frame entero, el menú se redibuja completo en el siguiente
+            game_menu.invalidate()
+        
+        if not args.headless:
+            profiler.stage('present')
+            if show_profiler:
+                presenter.present()
+            else:
+                presenter.present_rects(game_menu.dirty_rects)
+            if startup:
+                startup_done()
+            clock.tick(60)
+        if gameplay_loading:
+            profiler.stage('loading')
+            load_step()
+        profiler.end_frame()
         game_time += 1
         continue
     
     # JUEGO
-    display.fill(CYBER_COLORS['bg_dark'])
+    frame_start = time.perf_counter()
+    profiler.start_frame()
+    profiler.stage('background')
 
     game_time += 1
     level_time += 1
@@ -1605,37 +1997,19 @@ while True:
         map_transition += dt
         if (last < 60) and (map_transition >= 60):
             if next_level:
-                level_n = int(level_name.split('_')[-1])
-                level_name = level_name.split('_')[0] + '_' + str(level_n + 1)
+                # se registra el nivel superado, antes de pasar al siguiente
                 game_history.add_level_completed(level_name)
+                level_name = following_level(level_name)
+                profiler.instant('level_transition', level=level_name)
             reload_level(next_level)
         if map_transition > 120:
             map_transition = 0
 
     # background con grid cyber
-    grid_color = (0, 50, 80)
-    for x in range(0, display.get_width(), 20):
-        if abs(math.sin(game_time * 0.01 + x * 0.1)) > 0.5:
-            pygame.draw.line(display, grid_color, (x, 0), (x, display.get_height()), 1)
-    
-    for y in range(0, display.get_height(), 20):
-        if abs(math.sin(game_time * 0.01 + y * 0.1)) > 0.5:
-            pygame.draw.line(display, grid_color, (0, y), (display.get_width(), y), 1)
-
-    b_points = [[0, 16]]
-    b_points += [[display.get_width() / 30 * (i + 1) + math.sin((game_time + i * 120) / 4) * 8, 16 + math.sin((game_time + i * 10) / 10) * 4] for i in range(29)]
-    b_points += [[display.get_width(), 16], [display.get_width(), 0], [0, 0]]
-    b2_points = [[0, 16]]
-    b2_points += [[display.get_width() / 30 * (i + 1) + math.sin((game_time + i * 120 - scroll[0] * 0.5) / 10) * 8, 16 + math.sin((game_time + i * 10) / 10) * 4] for i in range(29)]
-    b2_points += [[display.get_width(), 16], [display.get_width(), 0], [0, 0]]
-    b2_points = [[display.get_width() - p[0], p[1] * 3] for p in b2_points]
-    back_surf = pygame.Surface((display.get_width(), 72))
-    pygame.draw.polygon(back_surf, (10, 15, 30), b2_points)
-    back_surf.set_colorkey((0, 0, 0))
-    display.blit(back_surf, (0, 0))
-    display.blit(pygame.transform.flip(back_surf, False, True), (0, display.get_height() - 72))
+    background.render_back(display, game_time, scroll)
 
     # camera
+    profiler.stage('camera')
     if (not map_transition) or (map_transition > 60):
         zoom += (1 - zoom) / 7
         if abs(1 - zoom) < 0.005:
@@ -1673,12 +2047,14 @@ while True:
         
         if random.randint(1, 7) == 1:
             color = CYBER_COLORS['safe'] if puzzle_solved else CYBER_COLORS['danger']
-            particles.append(particles_m.Particle(door[0] + 6, door[1] + 9, 'light', [random.randint(0, 10) / 10 - 0.5, random.randint(0, 10) / 10 - 2], 0.1, 3.5 + random.randint(0, 20) / 10, custom_color=color))
+            if quality.keep('particles'):
+                particles.append(particles_m.Particle(door[0] + 6, door[1] + 9, 'light', [random.randint(0, 10) / 10 - 0.5, random.randint(0, 10) / 10 - 2], 0.1, 3.5 + random.randint(0, 20) / 10, custom_color=color))
         
         if player.get_distance([door[0] + 6, door[1] + 9]) < 5:
             if puzzle_solved:
                 if map_transition == 0:
-                    fadeout_music(500)
+                    # la pista del siguiente nivel se prepara durante el fundido y entra con un crossfade
+                    music.prepare(level_music(following_level(level_name)))
                     map_transition = 1
                     next_level = True
                     play_sound('door')
@@ -1687,8 +2063,11 @@ while True:
                     player_message = [120, 'Terminal de acceso bloqueada!', '']
 
     # render tiles
+    profiler.stage('tiles')
     render_list = level_map.get_visible(scroll)
     collideables = []
+    # los tiles se dibujan directo desde la página del atlas en un solo display.blits
+    tile_blits = []
     for layer in render_list:
         for tile in layer:
             offset = [0, 0]
@@ -1701,27 +2080,33 @@ while True:
                 collideables.append(pygame.Rect(tile[0][0], tile[0][1], TILE_SIZE, TILE_SIZE))
             if tile[1][0] == 'torches':
                 if random.randint(1, 6) == 1:
-                    particles.append(particles_m.Particle(tile[0][0] + 6, tile[0][1] + 4, 'light', [random.randint(0, 10) / 10 - 0.5, random.randint(0, 10) / 10 - 2], 0.1, 3 + random.randint(0, 20) / 10, custom_color=CYBER_COLORS['primary_cyan']))
+                    if quality.keep('particles'):
+                        particles.append(particles_m.Particle(tile[0][0] + 6, tile[0][1] + 4, 'light', [random.randint(0, 10) / 10 - 0.5, random.randint(0, 10) / 10 - 2], 0.1, 3 + random.randint(0, 20) / 10, custom_color=CYBER_COLORS['primary_cyan']))
                 torch_sin = math.sin((tile[0][1] % 100 + 200) / 300 * game_time * 0.01)
-                particles_m.blit_center_add(display, particles_m.circle_surf(15 + (torch_sin + 3) * 8.5, (0, 4 + (torch_sin + 4) * 0.5, 8 + (torch_sin + 4) * 0.9)), (tile[0][0] - scroll[0] + 6, tile[0][1] - scroll[1] + 4))
-                particles_m.blit_center_add(display, particles_m.circle_surf(9 + (torch_sin + 3) * 4, (0, 8 + (torch_sin + 4) * 0.5, 12 + (torch_sin + 4) * 0.9)), (tile[0][0] - scroll[0] + 6, tile[0][1] - scroll[1] + 4))
+                light_map.add((tile[0][0] - scroll[0] + 6, tile[0][1] - scroll[1] + 4), 15 + (torch_sin + 3) * 8.5, (0, 4 + (torch_sin + 4) * 0.5, 8 + (torch_sin + 4) * 0.9))
+                light_map.add((tile[0][0] - scroll[0] + 6, tile[0][1] - scroll[1] + 4), 9 + (torch_sin + 3) * 4, (0, 8 + (torch_sin + 4) * 0.5, 12 + (torch_sin + 4) * 0.9))
             if (tile[1][0] == 'decorations') and (tile[1][1] == 0):
                 if random.randint(1, 2) == 1:
                     p_offset = random.choice([[-8, 1], [8, 1], [4, 4], [-4, 4]])
-                    particles.append(particles_m.Particle(tile[0][0] + TILE_SIZE + p_offset[0], tile[0][1] + TILE_SIZE * 1.5 + p_offset[1], 'light', [random.randint(0, 10) / 10 - 0.5, random.randint(0, 10) / 10 - 2], 0.1, 4 + random.randint(0, 20) / 10, custom_color=CYBER_COLORS['primary_cyan']))
+                    if quality.keep('particles'):
+                        particles.append(particles_m.Particle(tile[0][0] + TILE_SIZE + p_offset[0], tile[0][1] + TILE_SIZE * 1.5 + p_offset[1], 'light', [random.randint(0, 10) / 10 - 0.5, random.randint(0, 10) / 10 - 2], 0.1, 4 + random.randint(0, 20) / 10, custom_color=CYBER_COLORS['primary_cyan']))
                 torch_sin = math.sin((tile[0][1] % 100 + 200) / 300 * game_time * 0.01)
-                particles_m.blit_center_add(display, particles_m.circle_surf(15 + (torch_sin + 3) * 8.5, (0, 4 + (torch_sin + 4) * 0.7, 8 + (torch_sin + 4) * 1.3)), (tile[0][0] - scroll[0] + TILE_SIZE, tile[0][1] - scroll[1] + TILE_SIZE * 1.5))
-                particles_m.blit_center_add(display, particles_m.circle_surf(9 + (torch_sin + 3) * 4, (0, 8 + (torch_sin + 4) * 0.7, 12 + (torch_sin + 4) * 1.3)), (tile[0][0] - scroll[0] + TILE_SIZE, tile[0][1] - scroll[1]  + TILE_SIZE * 1.5))
+                light_map.add((tile[0][0] - scroll[0] + TILE_SIZE, tile[0][1] - scroll[1] + TILE_SIZE * 1.5), 15 + (torch_sin + 3) * 8.5, (0, 4 + (torch_sin + 4) * 0.7, 8 + (torch_sin + 4) * 1.3))
+                light_map.add((tile[0][0] - scroll[0] + TILE_SIZE, tile[0][1] - scroll[1]  + TILE_SIZE * 1.5), 9 + (torch_sin + 3) * 4, (0, 8 + (torch_sin + 4) * 0.7, 12 + (torch_sin + 4) * 1.3))
             if tile[1][0] != 'mana':
-                img = spritesheet_loader.get_img(spritesheets, tile[1])
-                display.blit(img, (math.floor(tile[0][0] - scroll[0] + offset[0]), math.floor(tile[0][1] - scroll[1] + offset[1])))
+                page, area = atlas.regions[spritesheet_loader.get_img(spritesheets, tile[1])]
+                tile_blits.append((page, (math.floor(tile[0][0] - scroll[0] + offset[0]), math.floor(tile[0][1] - scroll[1] + offset[1])), area))
             else:
+                display.blits(tile_blits, False)
+                tile_blits = []
                 render_firewall([tile[0][0] + 6 - scroll[0], tile[0][1] + 6 - scroll[1]])
                 torch_sin = math.sin((tile[0][1] % 100 + 200) / 300 * game_time * 0.01)
-                particles_m.blit_center_add(display, particles_m.circle_surf(15 + (torch_sin + 3) * 8.5, (0, 4 + (torch_sin + 4) * 0.5, 8 + (torch_sin + 4) * 0.9)), (tile[0][0] - scroll[0] + 6, tile[0][1] - scroll[1] + 4))
-                particles_m.blit_center_add(display, particles_m.circle_surf(9 + (torch_sin + 3) * 4, (0, 8 + (torch_sin + 4) * 0.5, 12 + (torch_sin + 4) * 0.9)), (tile[0][0] - scroll[0] + 6, tile[0][1] - scroll[1] + 4))
+                light_map.add((tile[0][0] - scroll[0] + 6, tile[0][1] - scroll[1] + 4), 15 + (torch_sin + 3) * 8.5, (0, 4 + (torch_sin + 4) * 0.5, 8 + (torch_sin + 4) * 0.9))
+                light_map.add((tile[0][0] - scroll[0] + 6, tile[0][1] - scroll[1] + 4), 9 + (torch_sin + 3) * 4, (0, 8 + (torch_sin + 4) * 0.5, 12 + (torch_sin + 4) * 0.9))
+    display.blits(tile_blits, False)
     
     # Renderizar NPCs y Puzzles
+    profiler.stage('systems')
     for npc in npcs:
         npc.render(display, scroll, game_time)
         if npc.can_interact(player.pos) and not npc.talked:
@@ -1770,6 +2155,7 @@ while True:
         traffic_analyzer.render(display, scroll, game_time)
     
     # Renderizar jugador después de tiles pero antes de actualización
+    profiler.stage('player')
     if not death:
         player.render(display, scroll)
 
@@ -1849,10 +2235,11 @@ while True:
         if soul.pos[1] > scroll[1] + display.get_height():
             soul.pos[1] = scroll[1] + display.get_height()
         if random.randint(1, 3) == 1:
-            particles.append(particles_m.Particle(soul.pos[0] + 3, soul.pos[1] + 4, 'light', [random.randint(0, 10) / 10 - 0.5, random.randint(0, 10) / 10 + 1], 0.2, 3 + random.randint(0, 20) / 10, custom_color=CYBER_COLORS['primary_cyan']))
+            if quality.keep('particles'):
+                particles.append(particles_m.Particle(soul.pos[0] + 3, soul.pos[1] + 4, 'light', [random.randint(0, 10) / 10 - 0.5, random.randint(0, 10) / 10 + 1], 0.2, 3 + random.randint(0, 20) / 10, custom_color=CYBER_COLORS['primary_cyan']))
         torch_sin = math.sin((soul.center[1] % 100 + 200) / 300 * game_time * 0.1)
-        particles_m.blit_center_add(display, particles_m.circle_surf(7 + (torch_sin + 3) * 3, (0, 4 + (torch_sin + 4) * 0.5, 18 + (torch_sin + 4) * 0.9)), (soul.center[0] - 1 - scroll[0], soul.center[1] - 4 - scroll[1]))
-        particles_m.blit_center_add(display, particles_m.circle_surf(5 + (torch_sin + 3) * 2, (0, 8 + (torch_sin + 4) * 0.5, 18 + (torch_sin + 4) * 0.9)), (soul.center[0] - 1 - scroll[0], soul.center[1] - 4 - scroll[1]))
+        light_map.add((soul.center[0] - 1 - scroll[0], soul.center[1] - 4 - scroll[1]), 7 + (torch_sin + 3) * 3, (0, 4 + (torch_sin + 4) * 0.5, 18 + (torch_sin + 4) * 0.9))
+        light_map.add((soul.center[0] - 1 - scroll[0], soul.center[1] - 4 - scroll[1]), 5 + (torch_sin + 3) * 2, (0, 8 + (torch_sin + 4) * 0.5, 18 + (torch_sin + 4) * 0.9))
         if tutorial_2 == 0:
             tutorial_2 = 1
     else:
@@ -1870,30 +2257,33 @@ while True:
                 game_history.add_firewall_collected()
                 rm = layer
                 for i in range(2):
-                    sparks.append([tile_center.copy(), math.pi / 2 + math.pi * i, 10, 6, CYBER_COLORS['primary_green']])
-                    sparks.append([tile_center.copy(), math.pi * i, 6, 3, CYBER_COLORS['primary_cyan']])
+                    if quality.keep('sparks'):
+                        sparks.append([tile_center.copy(), math.pi / 2 + math.pi * i, 10, 6, CYBER_COLORS['primary_green']])
+                    if quality.keep('sparks'):
+                        sparks.append([tile_center.copy(), math.pi * i, 6, 3, CYBER_COLORS['primary_cyan']])
                 for i in range(20):
-                    particles.append(particles_m.Particle(tile_center[0], tile_center[1], 'light', [random.randint(0, 10) / 10 - 0.5, (random.randint(0, 120) / 10 + 1) * random.choice([-1, 1])], 0.1, 2 + random.randint(0, 20) / 10, custom_color=CYBER_COLORS['primary_green']))
+                    if quality.keep('particles'):
+                        particles.append(particles_m.Particle(tile_center[0], tile_center[1], 'light', [random.randint(0, 10) / 10 - 0.5, (random.randint(0, 120) / 10 + 1) * random.choice([-1, 1])], 0.1, 2 + random.randint(0, 20) / 10, custom_color=CYBER_COLORS['primary_green']))
         if rm:
             del tile[rm]
 
     # input
-    for event in pygame.event.get():
+    profiler.stage('input')
+    for event in inputs.poll():
         if event.type == QUIT:
             if game_state == 'playing':
                 game_history.end_session(level_name)
-            pygame.quit()
-            sys.exit()
+            quit_game()
         if event.type == KEYDOWN:
             if event.key == K_ESCAPE:
                 if game_state == 'playing':
                     game_history.end_session(level_name)
                     game_state = 'menu'
                     game_menu.state = MenuState.MAIN
+                    game_menu.invalidate()
                     pygame.mouse.set_visible(True)
                 else:
-                    pygame.quit()
-                    sys.exit()
+                    quit_game()
             
             if event.key == K_SPACE and show_level_objectives and not objectives_dismissed:
                 show_level_objectives = False
@@ -1982,6 +2372,8 @@ while True:
                 if firewall_stack.pop():
                     play_sound('death')
             
+            if event.key == K_F3:
+                toggle_profiler()
             if event.key == K_q:
                 player_message = [180, 'Test message', '']
             if event.key == K_RIGHT:
@@ -2010,8 +2402,10 @@ while True:
                 if not death and (air_timer < 5) and not soul_mode and not map_transition:
                     play_sound('jump')
                     player_velocity[1] = -5.2
-                    sparks.append([list(player.rect.bottomleft), math.pi * 0.9, 2 + random.randint(0, 10) / 10, 5, CYBER_COLORS['primary_cyan']])
-                    sparks.append([list(player.rect.bottomright), math.pi * 0.1, 2 + random.randint(0, 10) / 10, 5, CYBER_COLORS['primary_cyan']])
+                    if quality.keep('sparks'):
+                        sparks.append([list(player.rect.bottomleft), math.pi * 0.9, 2 + random.randint(0, 10) / 10, 5, CYBER_COLORS['primary_cyan']])
+                    if quality.keep('sparks'):
+                        sparks.append([list(player.rect.bottomright), math.pi * 0.1, 2 + random.randint(0, 10) / 10, 5, CYBER_COLORS['primary_cyan']])
                 up = True
         if event.type == KEYUP:
             if event.key == K_RIGHT:
@@ -2027,6 +2421,7 @@ while True:
         player.render(display, scroll)
 
     # servidor infectado (reemplaza el ojo)
+    profiler.stage('events')
     eye_base = [386, 220]
     if not soul_mode:
         eye_angle = player.get_angle(eye_base) + math.pi
@@ -2043,7 +2438,7 @@ while True:
             render_server_boss(eye_base, scroll, eye_height, game_time)
 
     # events
-    dt = (time.time() - last_time) * 60
+    dt = inputs.frame_dt((time.time() - last_time) * 60)
     last_time = time.time()
 
     reset = False
@@ -2069,7 +2464,8 @@ while True:
                     angle = math.atan2(vel[1], vel[0])
                     spawn = [display.get_width() + scroll[0], display.get_height() * i / 15 + scroll[1]]
                     for j in range(5):
-                        sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 4 + random.randint(0, 30) / 10, 10, CYBER_COLORS['danger']])
+                        if quality.keep('sparks'):
+                            sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 4 + random.randint(0, 30) / 10, 10, CYBER_COLORS['danger']])
                     projectiles.append([spawn, vel, 'enemy'])
                 play_sound('eye_shoot_large')
         if events['lv1']:
@@ -2110,7 +2506,8 @@ while True:
                     else:
                         spawn = [scroll[0], display.get_height() * i / 5 + scroll[1]]
                     for j in range(5):
-                        sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 4 + random.randint(0, 30) / 10, 10, CYBER_COLORS['danger']])
+                        if quality.keep('sparks'):
+                            sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 4 + random.randint(0, 30) / 10, 10, CYBER_COLORS['danger']])
                     projectiles.append([spawn, vel, 'enemy'])
                 play_sound('eye_shoot_large')
         if (last < 3700) and (events['lv2timer'] >= 3700):
@@ -2135,7 +2532,8 @@ while True:
                     vel = [math.cos(angle) * speed, math.sin(angle) * speed]
                     spawn = eye_base.copy()
                     for j in range(3):
-                        sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 4 + random.randint(0, 30) / 10, 10, CYBER_COLORS['danger']])
+                        if quality.keep('sparks'):
+                            sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 4 + random.randint(0, 30) / 10, 10, CYBER_COLORS['danger']])
                     projectiles.append([spawn, vel, 'enemy'])
         elif (1300 < events['lv3timer'] < 1800):
             eye_target_height = 30
@@ -2148,7 +2546,8 @@ while True:
                     vel = [math.cos(angle) * speed, math.sin(angle) * speed]
                     spawn = eye_base.copy()
                     for j in range(3):
-                        sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 4 + random.randint(0, 30) / 10, 10, CYBER_COLORS['danger']])
+                        if quality.keep('sparks'):
+                            sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 4 + random.randint(0, 30) / 10, 10, CYBER_COLORS['danger']])
                     projectiles.append([spawn, vel, 'enemy'])
         elif (2500 < events['lv3timer'] < 3100):
             eye_target_height = 38
@@ -2161,7 +2560,8 @@ while True:
                     vel = [math.cos(angle) * speed, math.sin(angle) * speed]
                     spawn = eye_base.copy()
                     for j in range(3):
-                        sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 7 + random.randint(0, 30) / 10, 5, CYBER_COLORS['danger']])
+                        if quality.keep('sparks'):
+                            sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 7 + random.randint(0, 30) / 10, 5, CYBER_COLORS['danger']])
                     projectiles.append([spawn, vel, 'enemy'])
         elif (3600 < events['lv3timer'] < 4500):
             eye_target_height = 38
@@ -2178,7 +2578,8 @@ while True:
                         vel = [math.cos(angle) * speed, math.sin(angle) * speed]
                         spawn = eye_base.copy()
                         for k in range(3):
-                            sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 7 + random.randint(0, 30) / 10, 5, CYBER_COLORS['danger']])
+                            if quality.keep('sparks'):
+                                sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 7 + random.randint(0, 30) / 10, 5, CYBER_COLORS['danger']])
                         projectiles.append([spawn, vel, 'enemy'])
         elif (5200 < events['lv3timer'] < 5800):
             eye_target_height = 30
@@ -2191,7 +2592,8 @@ while True:
                     vel = [math.cos(angle) * speed, math.sin(angle) * speed]
                     spawn = eye_base.copy()
                     for j in range(3):
-                        sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 7 + random.randint(0, 30) / 10, 5, CYBER_COLORS['danger']])
+                        if quality.keep('sparks'):
+                            sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 7 + random.randint(0, 30) / 10, 5, CYBER_COLORS['danger']])
                     projectiles.append([spawn, vel, 'enemy'])
         else:
             eye_target_height = 4
@@ -2213,12 +2615,14 @@ while True:
             play_sound('death')
             ready_to_exit = True
             for i in range(35):
-                sparks.append([eye_base.copy(), math.radians(random.randint(1, 360)), 7 + random.randint(0, 30) / 10, 8, CYBER_COLORS['primary_green']])
+                if quality.keep('sparks'):
+                    sparks.append([eye_base.copy(), math.radians(random.randint(1, 360)), 7 + random.randint(0, 30) / 10, 8, CYBER_COLORS['primary_green']])
             for i in range(300):
                 angle = random.randint(1, 360)
                 speed = random.randint(70, 250) / 10
                 vel = [math.cos(angle) * speed, math.sin(angle) * speed]
-                particles.append(particles_m.Particle(eye_base[0], eye_base[1], 'red_light', vel, 0.2, 1.5 + random.randint(0, 20) / 10, custom_color=CYBER_COLORS['primary_green']))
+                if quality.keep('particles'):
+                    particles.append(particles_m.Particle(eye_base[0], eye_base[1], 'red_light', vel, 0.2, 1.5 + random.randint(0, 20) / 10, custom_color=CYBER_COLORS['primary_green']))
         if (last < 1200) and (events['lv3timer'] >= 1200):
             player_message = [200, CYBER_MESSAGES['more_attacks'], '']
     
@@ -2233,6 +2637,7 @@ while True:
             player_velocity[1] = 0
 
     # projectiles
+    profiler.stage('projectiles')
     if not soul_mode:
         r = player.rect
     else:
@@ -2259,12 +2664,14 @@ while True:
                         soul_mode = 0
                         scroll_target = scroll_target.copy()
                         for j in range(30):
-                            sparks.append([list(r.center), math.radians(random.randint(1, 360)), 5 + random.randint(0, 30) / 10, 4, CYBER_COLORS['danger']])
+                            if quality.keep('sparks'):
+                                sparks.append([list(r.center), math.radians(random.randint(1, 360)), 5 + random.randint(0, 30) / 10, 4, CYBER_COLORS['danger']])
                         for j in range(120):
                             angle = random.randint(1, 360)
                             speed = random.randint(70, 250) / 10
                             vel = [math.cos(angle) * speed, math.sin(angle) * speed]
-                            particles.append(particles_m.Particle(r.center[0], r.center[1], 'light', vel, 0.4, 2 + random.randint(0, 20) / 10, custom_color=CYBER_COLORS['danger']))
+                            if quality.keep('particles'):
+                                particles.append(particles_m.Particle(r.center[0], r.center[1], 'light', vel, 0.4, 2 + random.randint(0, 20) / 10, custom_color=CYBER_COLORS['danger']))
                 render_threat_warning(projectile, scroll, game_time)
     
     if projectiles_removed > 0:
@@ -2285,11 +2692,13 @@ while True:
             angle = math.atan2(vel[1], vel[0])
             spawn = [display.get_width() * random.random() + scroll[0], scroll[1]]
             for i in range(5):
-                sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 4 + random.randint(0, 30) / 10, 6, CYBER_COLORS['danger']])
+                if quality.keep('sparks'):
+                    sparks.append([spawn.copy(), angle + math.radians(random.randint(0, 80) - 40), 4 + random.randint(0, 30) / 10, 6, CYBER_COLORS['danger']])
             projectiles.append([spawn, vel, 'enemy'])
             play_sound('eye_shoot')
 
     # sparks
+    profiler.stage('sparks')
     for i, spark in sorted(enumerate(sparks), reverse=True):
         advance(spark[0], spark[1], spark[2] * dt)
         spark[2] -= 0.2 * dt
@@ -2306,43 +2715,39 @@ while True:
         pygame.draw.polygon(display, spark[4], point_list)
 
     # border fog
-    fog_surf = pygame.Surface((display.get_width(), 24))
-    pygame.draw.polygon(fog_surf, (0, 5, 10), b_points)
-    fog_surf.set_alpha(150)
-    fog_surf.set_colorkey((0, 0, 0))
-    display.blit(pygame.transform.flip(fog_surf, True, False), (0, -6))
-    display.blit(fog_surf, (0, 0))
-    display.blit(pygame.transform.flip(fog_surf, True, True), (0, display.get_height() - 24 + 6))
-    display.blit(pygame.transform.flip(fog_surf, False, True), (0, display.get_height() - 24))
-    side_fog = pygame.transform.scale(pygame.transform.rotate(fog_surf, 90), (24, display.get_height()))
-    display.blit(pygame.transform.flip(side_fog, False, True), (-6, 0))
-    display.blit(side_fog, (0, 0))
-    display.blit(pygame.transform.flip(side_fog, True, True), (display.get_width() - 24, 0))
-    display.blit(pygame.transform.flip(side_fog, True, False), (display.get_width() - 24 + 6, 0))
+    profiler.stage('fog')
+    background.render_fog(display, game_time)
 
     # particles
+    profiler.stage('particles')
     for i, particle in sorted(enumerate(particles), reverse=True):
         alive = particle.update(0.1 * dt)
         particle.draw(display, scroll)
         if particle.type == 'light' and particle.time_left > 0:
             circle_size = max(1, 5 + particle.time_left * 0.5 * (math.sin(particle.random_constant * game_time * 0.01) + 3))
-            particles_m.blit_center_add(display, particles_m.circle_surf(circle_size, (0, 1 + particle.time_left * 0.4, 4 + particle.time_left * 0.8)), (particle.x - scroll[0], particle.y - scroll[1]))
+            light_map.add((particle.x - scroll[0], particle.y - scroll[1]), circle_size, (0, 1 + particle.time_left * 0.4, 4 + particle.time_left * 0.8))
         if particle.type == 'red_light' and particle.time_left > 0:
             circle_size = max(1, 5 + particle.time_left * 0.5 * (math.sin(particle.random_constant * game_time * 0.01) + 3))
-            particles_m.blit_center_add(display, particles_m.circle_surf(circle_size, (8 + particle.time_left * 0.6, 1 + particle.time_left * 0.2, 4 + particle.time_left * 0.4)), (particle.x - scroll[0], particle.y - scroll[1]))
+            light_map.add((particle.x - scroll[0], particle.y - scroll[1]), circle_size, (8 + particle.time_left * 0.6, 1 + particle.time_left * 0.2, 4 + particle.time_left * 0.4))
         if not alive:
             particles.pop(i)
 
     # door vfx
+    profiler.stage('effects')
     if door:
-        particles_m.blit_center_add(display, particles_m.circle_surf(7 + 4 * (math.sin(game_time * 0.15) + 3), (0, 20, 12)), (door[0] + 6 - scroll[0], door[1] + 9 - scroll[1]))
+        light_map.add((door[0] + 6 - scroll[0], door[1] + 9 - scroll[1]), 7 + 4 * (math.sin(game_time * 0.15) + 3), (0, 20, 12))
         render_firewall([door[0] - scroll[0] + 6, door[1] - scroll[1] + 9], size=[2, 3], color1=(0, 50, 1), color2=CYBER_COLORS['safe'])
 
     # render soul
     if soul_mode:
         soul.render(display, scroll)
 
+    # los brillos acumulados en el light map se suman al frame de una vez
+    profiler.stage('lighting')
+    light_map.apply(display)
+
     # gui
+    profiler.stage('text')
     if player_message[0] and not death:
         player_message[0] -= 1
         if player_message[0] % 3 == 0:
@@ -2443,19 +2848,30 @@ while True:
     if show_level_objectives and not objectives_dismissed:
         render_level_objectives(level_name, game_time)
 
-    if zoom == 1:
-        screen.blit(pygame.transform.scale(display, screen.get_size()), (0, 0))
-    else:
-        size = [int(display.get_width() / zoom), int(display.get_height() / zoom)]
-        screen.blit(pygame.transform.scale(clip(display, (display.get_width() - size[0]) // 2, (display.get_height() - size[1]) // 2, size[0], size[1]), screen.get_size()), (0, 0))
+    inputs.checkpoint([level_name, round(player.pos[0], 3), round(player.pos[1], 3), len(projectiles)])
 
-    if map_transition:
-        black_surf = pygame.Surface(display.get_size()).convert_alpha()
-        if map_transition < 60:
-            black_surf.set_alpha(map_transition / 60 * 255)
-        else:
-            black_surf.set_alpha((1 - (map_transition - 60) / 60) * 255)
-        screen.blit(pygame.transform.scale(black_surf, screen.get_size()), (0, 0))
-    
-    pygame.display.update()
-    clock.tick(60)
\ No newline at end of file
+    profiler.count('projectiles', len(projectiles))
+    profiler.count('particles', len(particles))
+    profiler.count('sparks', len(sparks))
+    profiler.count('collideables', len(collideables))
+
+    if show_profiler:
+        profiler.stage('overlay')
+        profiler.render_overlay(display, font)
+
+    if not args.headless:
+        profiler.stage('present')
+        fade = 0
+        if map_transition:
+            if map_transition < 60:
+                fade = map_transition / 60 * 255
+            else:
+                fade = (1 - (map_transition - 60) / 60) * 255
+        presenter.present(zoom, fade)
+        if startup:
+            startup_done()
+        # el tiempo de trabajo del frame (sin la espera del clock) alimenta el LOD automático
+        if quality.update((time.perf_counter() - frame_start) * 1000):
+            apply_quality()
+        clock.tick(60)
+    profiler.end_frame()
@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+import pygame
+
+pygame.init()
+pygame.display.set_mode((300, 200))
+
+import scripts.core_funcs as core_funcs
+import scripts.spritesheet_loader as spritesheet_loader
+import scripts.tile_map as tile_map
+import scripts.anim_loader as anim_loader
+import scripts.particles as particles_m
+import scripts.text as text
+from scripts.lighting import LightMap
+from scripts.entity import Entity
+from scripts.sound_bank import SoundBank
+from scripts.atlas import Atlas
+
+TILE_SIZE = 12
+SAMPLE_TEXT = 'Los FIREWALLS bloquean trafico no autorizado.'
+
+benchmarks = {}
+
+# each benchmark does its setup and returns the callable that gets timed
+def bench(name):
+    def register(func):
+        benchmarks[name] = func
+        return func
+    return register
+
+def level_collideables(level_map, pos):
+    collideables = []
+    for layer in level_map.get_visible(pos):
+        for tile in layer:
+            if tile[1][0] == 'ground':
+                collideables.append(pygame.Rect(tile[0][0], tile[0][1], TILE_SIZE, TILE_SIZE))
+    return collideables
+
+@bench('text.Font.render')
+def bench_font_render():
+    font = text.Font('data/fonts/small_font.png', (0, 255, 100))
+    surf = pygame.Surface((300, 200))
+    return lambda: font.render(SAMPLE_TEXT, surf, (5, 5))
+
+@bench('text.Font.render_wrapped')
+def bench_font_render_wrapped():
+    font = text.Font('data/fonts/small_font.png', (0, 255, 100))
+    surf = pygame.Surface((300, 200))
+    return lambda: font.render(SAMPLE_TEXT, surf, (5, 5), line_width=80)
+
+@bench('text.Font.width')
+def bench_font_width():
+    font = text.Font('data/fonts/small_font.png', (0, 255, 100))
+    return lambda: font.width(SAMPLE_TEXT)
+
+@bench('tile_map.TileMap.load_map')
+def bench_load_map():
+    level_map = tile_map.TileMap((TILE_SIZE, TILE_SIZE), (300, 200))
+    return lambda: level_map.load_map('level_3.json')
+
+@bench('tile_map.TileMap.get_visible')
+def bench_get_visible():
+    level_map = tile_map.TileMap((TILE_SIZE, TILE_SIZE), (300, 200))
+    level_map.load_map('level_3.json')
+    return lambda: level_map.get_visible([200, 262])
+
+@bench('tile_map.TileMap.tile_collide')
+def bench_tile_collide():
+    level_map = tile_map.TileMap((TILE_SIZE, TILE_SIZE), (300, 200))
+    level_map.load_map('level_3.json')
+    return lambda: level_map.tile_collide([353, 368])
+
+@bench('entity.Entity.move')
+def bench_entity_move():
+    level_map = tile_map.TileMap((TILE_SIZE, TILE_SIZE), (300, 200))
+    level_map.load_map('level_3.json')
+    collideables = level_collideables(level_map, [200, 262])
+    player = Entity(anim_loader.AnimationManager(), [350, 362], (7, 13), 'player')
+    def move():
+        player.pos = [350, 362]
+        player.move([1.5, 3], collideables)
+    return move
+
+@bench('entity.Entity.img')
+def bench_entity_img():
+    player = Entity(anim_loader.AnimationManager(), [350, 362], (7, 13), 'player')
+    player.flip[0] = True
+    player.opacity = 120
+    return lambda: player.img
+
+@bench('entity.Entity.render')
+def bench_entity_render():
+    player = Entity(anim_loader.AnimationManager(), [350, 362], (7, 13), 'player')
+    player.flip[0] = True
+    surf = pygame.Surface((300, 200))
+    return lambda: player.render(surf, [200, 262])
+
+@bench('anim_loader.AnimationManager')
+def bench_animation_manager():
+    return anim_loader.AnimationManager
+
+@bench('anim_loader.Animation.play')
+def bench_animation_play():
+    animation = anim_loader.AnimationManager().new('player_idle')
+    return lambda: animation.play(1 / 60)
+
+@bench('anim_loader.Animation.calc_img')
+def bench_animation_calc_img():
+    animation = anim_loader.AnimationManager().new('player_idle')
+    animation.frame = 70
+    return animation.calc_img
+
+@bench('particles.Particle.update')
+def bench_particle_update():
+    particles_m.load_particle_images('data/images/particles')
+    particle = particles_m.Particle(100, 100, 'light', [0.5, -2], 0, 3)
+    return lambda: particle.update(0.1)
+
+@bench('particles.Particle.draw')
+def bench_particle_draw():
+    particles_m.load_particle_images('data/images/particles')
+    particle = particles_m.Particle(100, 100, 'light', [0.5, -2], 0, 3)
+    surf = pygame.Surface((300, 200))
+    return lambda: particle.draw(surf, [0, 0])
+
+@bench('particles.Particle.draw_colored')
+def bench_particle_draw_colored():
+    particles_m.load_particle_images('data/images/particles')
+    particle = particles_m.Particle(100, 100, 'light', [0.5, -2], 0, 3, custom_color=(0, 200, 255))
+    surf = pygame.Surface((300, 200))
+    return lambda: particle.draw(surf, [0, 0])
+
+@bench('particles.circle_surf')
+def bench_circle_surf():
+    return lambda: particles_m.circle_surf(30, (0, 6, 12))
+
+@bench('particles.swap_color')
+def bench_swap_color():
+    particles_m.load_particle_images('data/images/particles')
+    img = particles_m.particle_images['light'][2]
+    return lambda: particles_m.swap_color(img, (255, 255, 255), (0, 200, 255))
+
+@bench('lighting.LightMap.add')
+def bench_light_add():
+    light_map = LightMap((300, 200))
+    return lambda: light_map.add((120, 80), 32, (0, 6, 12))
+
+@bench('lighting.LightMap.apply')
+def bench_light_apply():
+    light_map = LightMap((300, 200))
+    surf = pygame.Surface((300, 200))
+    def apply():
+        light_map.add((120, 80), 32, (0, 6, 12))
+        light_map.apply(surf)
+    return apply
+
+@bench('sound_bank.SoundBank.play')
+def bench_sound_bank_play():
+    bank = SoundBank({'enemy': {'channels': 3, 'steal': False}}, {'eye_shoot': {'category': 'enemy', 'volume': 0.7, 'interval': 90}})
+    bank.get('eye_shoot')
+    clock = [0]
+    def play():
+        # one trigger every 3 frames, like the level 3 spiral
+        clock[0] += 50
+        bank.play('eye_shoot', clock[0])
+    return play
+
+@bench('spritesheet_loader.load_spritesheet')
+def bench_load_spritesheet():
+    sheet = pygame.image.load('data/images/tilesets/ground.png').convert()
+    def load():
+        # a fresh atlas each time, reusing one would keep growing it
+        spritesheet_loader.atlas = Atlas()
+        spritesheet_loader.load_spritesheet(sheet)
+    return load
+
+@bench('spritesheet_loader.find_tiles')
+def bench_find_tiles():
+    sheet = pygame.image.load('data/images/tilesets/ground.png').convert()
+    return lambda: spritesheet_loader.find_tiles(sheet)
+
+@bench('core_funcs.clip')
+def bench_clip():
+    sheet = pygame.image.load('data/images/tilesets/ground.png').convert()
+    return lambda: core_funcs.clip(sheet, 13, 1, 12, 12)
+
+def time_benchmark(func, min_time, repeat):
+    # calibrate the loop count so one sample takes at least min_time
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+    samples = [elapsed / number]
+    for i in range(repeat - 1):
+        start = time.perf_counter()
+        for j in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    samples.sort()
+    return {
+        'number': number,
+        'repeat': repeat,
+        'best_us': samples[0] * 1e6,
+        'median_us': samples[len(samples) // 2] * 1e6,
+        'worst_us': samples[-1] * 1e6,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks for the modules under scripts/')
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--min-time', type=float, default=0.05, help='minimum seconds per sample')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', help='write results as JSON')
+    args = parser.parse_args()
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'platform': platform.platform(),
+        },
+        'benchmarks': {},
+    }
+    for name in benchmarks:
+        if args.filter not in name:
+            continue
+        result = time_benchmark(benchmarks[name](), args.min_time, args.repeat)
+        results['benchmarks'][name] = result
+        print('{:<40} {:12.3f} us  (median {:.3f} us, {} loops)'.format(name, result['best_us'], result['median_us'], result['number']))
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
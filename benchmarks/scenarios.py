@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pygame
+
+import scripts.replay as replay_m
+
+LEVELS = ['level_1', 'level_2', 'level_3', 'level_4', 'debug']
+GAME_SCRIPT = os.path.join(ROOT, 'Wandering Soul.py')
+
+# per-stage percentiles checked by compare
+COMPARED_METRICS = ['p50', 'p95', 'p99']
+
+def run_scenario(level, ticks, replay_path, tmp_dir):
+    out_path = os.path.join(tmp_dir, level + '.json')
+    source = replay_path
+    if not replay_path:
+        source = 'scripted'
+        replay_path = os.path.join(tmp_dir, level + '.replay')
+        replay_m.scripted_replay(level, ticks).save(replay_path)
+    cmd = [sys.executable, GAME_SCRIPT, '--replay', replay_path, '--headless', '--ticks', str(ticks), '--bench-out', out_path]
+    subprocess.run(cmd, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    with open(out_path, 'r', encoding='utf-8') as f:
+        result = json.load(f)
+    result['replay'] = source
+    return result
+
+def run(levels, ticks, replay_dir, out_path):
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'platform': platform.platform(),
+            'ticks': ticks,
+        },
+        'scenarios': {},
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for level in levels:
+            replay_path = None
+            if replay_dir and os.path.exists(os.path.join(replay_dir, level + '.replay')):
+                replay_path = os.path.join(replay_dir, level + '.replay')
+            result = run_scenario(level, ticks, replay_path, tmp_dir)
+            results['scenarios'][level] = result
+            total = result['stages']['total']
+            print('{:<8} p50 {:6.2f}ms  p95 {:6.2f}ms  p99 {:6.2f}ms  peak projectiles {:4}  peak particles {:5}  max rss {} KB'.format(
+                level, total['p50'], total['p95'], total['p99'], result['peaks'].get('projectiles', 0), result['peaks'].get('particles', 0), result['max_rss_kb']))
+    if out_path:
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+def compare(base, new, threshold, min_ms):
+    regressions = []
+    for level in new['scenarios']:
+        if level not in base['scenarios']:
+            continue
+        old_stages = base['scenarios'][level]['stages']
+        new_stages = new['scenarios'][level]['stages']
+        for stage in new_stages:
+            if stage not in old_stages:
+                continue
+            for metric in COMPARED_METRICS:
+                old_v = old_stages[stage][metric]
+                new_v = new_stages[stage][metric]
+                # sub-floor timings are mostly timer noise
+                if max(old_v, new_v) < min_ms:
+                    continue
+                change = (new_v - old_v) / old_v if old_v else float('inf')
+                if change > threshold:
+                    regressions.append((level, stage + ' ' + metric, old_v, new_v, change))
+        old_rss = base['scenarios'][level].get('max_rss_kb')
+        new_rss = new['scenarios'][level].get('max_rss_kb')
+        if old_rss and new_rss and (new_rss - old_rss) / old_rss > threshold:
+            regressions.append((level, 'max_rss_kb', old_rss, new_rss, (new_rss - old_rss) / old_rss))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless scenario benchmarks driven by replays')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_p = sub.add_parser('run', help='run the scenarios and report frame timings')
+    run_p.add_argument('--levels', nargs='+', default=LEVELS)
+    run_p.add_argument('--ticks', type=int, default=1800)
+    run_p.add_argument('--replay-dir', help='directory with recorded <level>.replay files; levels without one use a scripted run')
+    run_p.add_argument('--out', help='write results as JSON')
+    cmp_p = sub.add_parser('compare', help='compare two result files and flag regressions')
+    cmp_p.add_argument('base')
+    cmp_p.add_argument('new')
+    cmp_p.add_argument('--threshold', type=float, default=0.1, help='relative slowdown that counts as a regression')
+    cmp_p.add_argument('--min-ms', type=float, default=0.05, help='ignore timings below this on both sides')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run(args.levels, args.ticks, args.replay_dir, args.out)
+    else:
+        with open(args.base, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+        with open(args.new, 'r', encoding='utf-8') as f:
+            new = json.load(f)
+        regressions = compare(base, new, args.threshold, args.min_ms)
+        for level, metric, old_v, new_v, change in regressions:
+            print('REGRESSION {:<8} {:<20} {:10.3f} -> {:10.3f} (+{:.0%})'.format(level, metric, old_v, new_v, change))
+        if regressions:
+            sys.exit(1)
+        print('no regressions beyond {:.0%}'.format(args.threshold))
+
+if __name__ == '__main__':
+    main()
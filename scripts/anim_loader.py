@@ -1,58 +1,78 @@
-import os, json
+import os, json, math, bisect
+from types import MappingProxyType
 
 import pygame
 
 from .core_funcs import *
+from .atlas import atlas
+from .asset_cache import asset_cache
 
 ANIMATION_PATH = 'data/images/animations'
 COLORKEY = (0, 0, 0)
 
 def load_img(path, colorkey):
-    img = pygame.image.load(path).convert()
+    img = atlas.add(asset_cache.load_image(path).convert())
     img.set_colorkey(colorkey)
     return img
 
+# frame files in playback order and the config of an animation folder
+def frame_table(path, files):
+    frames = sorted(files, key=lambda img: int(img.split('.')[0].split('_')[-1]))
+    try:
+        f = open(path + '/config.json', 'r')
+        config = json.loads(f.read())
+        f.close()
+    except FileNotFoundError:
+        # defaults stay in memory, the data directory is never written to
+        config = {
+            'frames': [5 for i in range(len(frames))],
+            'loop': True,
+            'speed': 1.0,
+            'centered': False,
+            'paused': False,
+            'outline': None,
+            'offset': [0, 0],
+        }
+    return frames, config
+
 class AnimationData:
     def __init__(self, path, colorkey=None):
         self.id = path.split('/')[-1]
-        self.image_list = []
-        for img in os.listdir(path):
-            if img.split('.')[-1] == 'png':
-                self.image_list.append([int(img.split('.')[0].split('_')[-1]), load_img(path + '/' + img, colorkey)])
-        try:
-            f = open(path + '/config.json', 'r')
-            self.config = json.loads(f.read())
-            f.close()
-        except FileNotFoundError:
-            self.config = {
-                'frames': [5 for i in range(len(self.image_list))],
-                'loop': True,
-                'speed': 1.0,
-                'centered': False,
-                'paused': False,
-                'outline': None,
-                'offset': [0, 0],
-            }
-            f = open(path + '/config.json', 'w')
-            f.write(json.dumps(self.config))
-            f.close()
-        self.image_list.sort()
-        self.image_list = [v[1] for v in self.image_list]
+        files = [img for img in os.listdir(path) if img.split('.')[-1] == 'png']
+        sources = [path + '/' + img for img in files]
+        if os.path.exists(path + '/config.json'):
+            sources.append(path + '/config.json')
+        table = asset_cache.get(('animation', path), sources)
+        if table is None:
+            table = frame_table(path, files)
+            asset_cache.put(('animation', path), sources, table)
+        frames, config = table
+        self.image_list = [load_img(path + '/' + img, colorkey) for img in frames]
+        # shared by every Animation made from this data, so it is read-only. playback
+        # settings are copied into each Animation when it is created
+        self.config = MappingProxyType(config)
         self.frame_surfs = []
         total = 0
         for i, frame in enumerate(self.config['frames']):
             total += frame
             self.frame_surfs.append([total, self.image_list[i]])
-
-    @property
-    def duration(self):
-        return sum(self.config['frames'])
+        # cumulative end of each frame except the last, searched with bisect instead of
+        # walking frame_surfs. anything past them resolves to the last frame
+        self.frame_ends = [frame[0] for frame in self.frame_surfs[:-1]]
+        self.frame_imgs = [frame[1] for frame in self.frame_surfs]
+        self.duration = total
 
 class Animation:
     def __init__(self, animation_data):
         self.data = animation_data
         self.frame = 0
-        self.paused = self.data.config['paused']
+        config = animation_data.config
+        self.speed = config['speed']
+        self.loop = config['loop']
+        self.paused = config['paused']
+        self.centered = config['centered']
+        self.outline = config['outline']
+        self.offset = tuple(config['offset'])
         self.calc_img()
         self.rotation = 0
         self.just_looped = False
@@ -61,36 +81,31 @@ class Animation:
         img = self.img
         if self.rotation:
             img = pygame.transform.rotate(self.img, self.rotation)
-        if self.data.config['outline']:
+        if self.outline:
             outline(surf, img, (pos[0] - offset[0] - img.get_width() // 2, pos[1] - offset[1] - img.get_height() // 2))
-        if self.data.config['centered']:
+        if self.centered:
             surf.blit(img, (pos[0] - offset[0] - img.get_width() // 2, pos[1] - offset[1] - img.get_height() // 2))
         else:
             surf.blit(img, (pos[0] - offset[0], pos[1] - offset[1]))
 
     def calc_img(self):
-        for frame in self.data.frame_surfs:
-            if frame[0] > self.frame:
-                self.img = frame[1]
-                break
-        if self.data.frame_surfs[-1][0] < self.frame:
-            self.img = self.data.frame_surfs[-1][1]
+        self.img = self.data.frame_imgs[bisect.bisect_right(self.data.frame_ends, self.frame)]
 
     def play(self, dt):
         self.just_looped = False
         if not self.paused:
-            self.frame += dt * 60 * self.data.config['speed']
-        if self.data.config['loop']:
-            while self.frame > self.data.duration:
-                self.frame -= self.data.duration
-                self.just_looped = True
+            self.frame += dt * 60 * self.speed
+        if self.loop and (self.frame > self.data.duration):
+            # wraps into (0, duration] like repeated subtraction would
+            self.frame -= math.ceil(self.frame / self.data.duration - 1) * self.data.duration
+            self.just_looped = True
         self.calc_img()
 
     def rewind(self):
         self.frame = 0
 
     def set_speed(self, speed):
-        self.data.config['speed'] = speed
+        self.speed = speed
 
     def set_frame_index(self, index):
         self.frame = self.data.frame_surfs[index][0]
@@ -101,11 +116,24 @@ class Animation:
     def unpause(self):
         self.paused = False
 
+# only the animation folders are indexed up front, frames are decoded the first time an
+# animation is used (or by preload) and kept for later instances
 class AnimationManager:
-    def __init__(self):
+    def __init__(self, path=ANIMATION_PATH):
         self.animations = {}
-        for anim in os.listdir(ANIMATION_PATH):
-            self.animations[anim] = AnimationData(ANIMATION_PATH + '/' + anim, COLORKEY)
+        for anim in os.listdir(path):
+            if os.path.isdir(path + '/' + anim):
+                self.animations[anim] = path + '/' + anim
+        self.loaded = {}
+
+    def get(self, anim_id):
+        if anim_id not in self.loaded:
+            self.loaded[anim_id] = AnimationData(self.animations[anim_id], COLORKEY)
+        return self.loaded[anim_id]
+
+    def preload(self, anim_ids):
+        for anim_id in anim_ids:
+            self.get(anim_id)
 
     def new(self, anim_id):
-        return Animation(self.animations[anim_id])
+        return Animation(self.get(anim_id))
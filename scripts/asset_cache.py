@@ -0,0 +1,144 @@
+import os
+import pickle
+import hashlib
+
+import pygame
+
+CACHE_PATH = 'data/cache/assets.cache'
+CACHE_VERSION = 1
+FONT_PATH = 'data/fonts'
+TILESET_PATH = 'data/images/tilesets'
+PARTICLE_PATH = 'data/images/particles'
+IMAGE_PATH = 'data/images'
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+# 'data/images/tilesets//ground.png' and 'data/images/tilesets/ground.png' share an entry
+def cache_key(key, sources):
+    return (key[0], os.path.normpath(key[1])), [os.path.normpath(path) for path in sources]
+
+def file_stat(path):
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns)
+
+# preprocessed assets (decoded pixels and the results of the marker scans) stored in one
+# file so a cold start is a single bulk read. every entry records the hash of the source
+# files it was built from and is ignored once they change, the loaders then fall back to
+# decoding and scanning the sources. only the build command writes the cache.
+class AssetCache:
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.entries = None
+        self.building = False
+        # path -> future of a decode started by prefetch
+        self.decoded = {}
+
+    def open(self):
+        self.entries = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                dat = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            print('Could not read ' + self.path + ', loading assets from source')
+            return
+        if dat.get('version') == CACHE_VERSION:
+            self.entries = dat['entries']
+
+    def valid(self, entry, sources):
+        if set(entry['sources']) != set(sources):
+            return False
+        for path in sources:
+            if not os.path.exists(path):
+                return False
+            size, mtime, digest = entry['sources'][path]
+            stat = file_stat(path)
+            if stat != (size, mtime):
+                # touched (checkout, copy) but maybe not changed, the hash decides
+                if file_hash(path) != digest:
+                    return False
+                entry['sources'][path] = (stat[0], stat[1], digest)
+        return True
+
+    def get(self, key, sources):
+        if self.building:
+            return None
+        key, sources = cache_key(key, sources)
+        if self.entries is None:
+            self.open()
+        entry = self.entries.get(key)
+        if entry and self.valid(entry, sources):
+            return entry['data']
+        return None
+
+    def put(self, key, sources, data):
+        if self.building:
+            key, sources = cache_key(key, sources)
+            self.entries[key] = {'sources': {path: file_stat(path) + (file_hash(path),) for path in sources}, 'data': data}
+
+    # drop-in for pygame.image.load, the surface still has to be converted by the caller.
+    # prefetched surfaces are shared between callers, so they must not be drawn on
+    def load_image(self, path):
+        future = self.decoded.get(os.path.normpath(path))
+        if future:
+            return future.result()
+        return self.decode(path)
+
+    # starts decoding path with submit(func, *args) -> future, usually on a worker thread
+    def prefetch(self, path, submit):
+        if self.entries is None:
+            # read on this thread, not by whichever worker gets there first
+            self.open()
+        self.decoded[os.path.normpath(path)] = submit(self.decode, path)
+
+    def decode(self, path):
+        pixels = self.get(('image', path), [path])
+        if pixels:
+            return pygame.image.frombuffer(pixels[1], pixels[0], 'RGB')
+        img = pygame.image.load(path)
+        self.put(('image', path), [path], (img.get_size(), pygame.image.tostring(img, 'RGB')))
+        return img
+
+    def start_build(self):
+        self.entries = {}
+        self.building = True
+
+    def save(self):
+        self.building = False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'wb') as f:
+            pickle.dump({'version': CACHE_VERSION, 'entries': self.entries}, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(self.path + '.tmp', self.path)
+
+asset_cache = AssetCache()
+
+# runs every loader once against the sources and stores what they decoded and scanned:
+#     python -m scripts.asset_cache
+def build():
+    from . import spritesheet_loader, text, anim_loader, particles
+    asset_cache.start_build()
+    spritesheet_loader.load_spritesheets(TILESET_PATH)
+    for font_file in sorted(os.listdir(FONT_PATH)):
+        if font_file.split('.')[-1] == 'png':
+            text.Font(FONT_PATH + '/' + font_file, (255, 255, 255))
+    animations = anim_loader.AnimationManager()
+    animations.preload(sorted(animations.animations))
+    particles.load_particle_images(PARTICLE_PATH)
+    for img_file in sorted(os.listdir(IMAGE_PATH)):
+        if img_file.split('.')[-1] == 'png':
+            asset_cache.load_image(IMAGE_PATH + '/' + img_file)
+    asset_cache.save()
+    print('Cached {} assets in {} ({} KB)'.format(len(asset_cache.entries), asset_cache.path, os.path.getsize(asset_cache.path) // 1024))
+
+if __name__ == '__main__':
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    pygame.init()
+    # convert() needs a display mode
+    pygame.display.set_mode((1, 1))
+    # run as a script this file is __main__, the loaders use the scripts.asset_cache instance
+    from scripts.asset_cache import build
+    build()
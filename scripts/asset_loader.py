@@ -0,0 +1,87 @@
+import os
+import time
+import threading
+from functools import partial
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .asset_cache import asset_cache
+
+MAX_WORKERS = 8
+
+# every file with the extension in path and its subfolders
+def asset_files(path, ext):
+    found = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        found += [root + '/' + f for f in sorted(files) if f.split('.')[-1] == ext]
+    return found
+
+# decodes independent asset groups on a thread pool while the main thread keeps going.
+# image and sound decoding release the GIL, convert() needs the display so the loaders
+# still do it on the main thread when they pick the decoded surfaces up. with a single
+# core the jobs run inline, a pool would only add overhead.
+class AssetLoader:
+    def __init__(self, workers=None):
+        self.workers = workers or min(MAX_WORKERS, os.cpu_count() or 1)
+        self.pool = ThreadPoolExecutor(self.workers) if self.workers > 1 else None
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        # group -> jobs, decode seconds (summed over workers), seconds on the main thread
+        self.groups = {}
+
+    def group(self, name):
+        if name not in self.groups:
+            self.groups[name] = {'jobs': 0, 'decode': 0, 'main': 0}
+        return self.groups[name]
+
+    def run(self, name, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            with self.lock:
+                self.groups[name]['decode'] += time.perf_counter() - start
+
+    def submit(self, name, func, *args):
+        self.group(name)['jobs'] += 1
+        if self.pool:
+            return self.pool.submit(self.run, name, func, *args)
+        future = Future()
+        try:
+            future.set_result(self.run(name, func, *args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    # submit for the prefetch/preload hooks of the loaders, jobs are timed under name
+    def submitter(self, name):
+        return partial(self.submit, name)
+
+    def images(self, name, paths):
+        for path in paths:
+            asset_cache.prefetch(path, self.submitter(name))
+
+    # times the main thread part of a group (waiting for its jobs, convert, scans)
+    @contextmanager
+    def finish(self, name):
+        group = self.group(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            group['main'] += time.perf_counter() - start
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown(wait=False)
+        self.total = time.perf_counter() - self.start
+
+    def summary(self):
+        return {name: {'jobs': g['jobs'], 'decode_ms': round(g['decode'] * 1000, 3), 'main_ms': round(g['main'] * 1000, 3)} for name, g in self.groups.items()}
+
+    def report(self):
+        lines = ['Assets loaded in {:.1f} ms on {} worker(s)'.format(self.total * 1000, self.workers)]
+        for name, g in self.summary().items():
+            lines.append('  {:<11} {:>3} jobs  decode {:>6.2f} ms  main thread {:>6.2f} ms'.format(name, g['jobs'], g['decode_ms'], g['main_ms']))
+        return '\n'.join(lines)
@@ -0,0 +1,58 @@
+import pygame
+
+PAGE_SIZE = 512
+COLORKEY = (0, 0, 0)
+
+# packs many small images into a few large page surfaces (shelf packing: images are
+# placed left to right on rows as tall as their tallest image). add() returns a
+# subsurface of the page, which blits like the original image but shares its pixels.
+# every image in the atlas uses the page colorkey, so hot loops can also blit straight
+# from the page with the (page, rect) from regions, which batches well with blits().
+class Atlas:
+    def __init__(self, page_size=PAGE_SIZE, colorkey=COLORKEY):
+        self.page_size = page_size
+        self.colorkey = colorkey
+        self.pages = []
+        self.regions = {}
+        self.shelf_x = 0
+        self.shelf_y = 0
+        self.shelf_h = 0
+
+    def new_page(self, size=None):
+        page = pygame.Surface(size or (self.page_size, self.page_size))
+        page.fill(self.colorkey)
+        page.set_colorkey(self.colorkey)
+        self.pages.append(page)
+        self.shelf_x = self.shelf_y = self.shelf_h = 0
+        return page
+
+    def place(self, w, h):
+        if (w > self.page_size) or (h > self.page_size):
+            # too big to share a page, it gets one of its own and the next image starts a new page
+            page = self.new_page((w, h))
+            self.shelf_y = self.page_size
+            return page, (0, 0)
+        if (not self.pages) or (self.shelf_y + h > self.page_size):
+            self.new_page()
+        if self.shelf_x + w > self.page_size:
+            self.shelf_x = 0
+            self.shelf_y += self.shelf_h
+            self.shelf_h = 0
+            if self.shelf_y + h > self.page_size:
+                self.new_page()
+        pos = (self.shelf_x, self.shelf_y)
+        self.shelf_x += w
+        self.shelf_h = max(self.shelf_h, h)
+        return self.pages[-1], pos
+
+    def add(self, surf):
+        w, h = surf.get_size()
+        page, pos = self.place(w, h)
+        page.blit(surf, pos)
+        rect = pygame.Rect(pos, (w, h))
+        img = page.subsurface(rect)
+        img.set_colorkey(self.colorkey)
+        self.regions[img] = (page, rect)
+        return img
+
+atlas = Atlas()
@@ -0,0 +1,142 @@
+import math
+
+import pygame
+
+FOG_ALPHA = 150
+FOG_DEPTH = 24
+GRID_SPACING = 20
+# the fog wave repeats every 40 * pi frames (lcm of its 8 * pi and 20 * pi components)
+FOG_CYCLE = math.pi * 40
+FOG_PHASES = 63
+WAVE_STEPS = 128
+
+# draws the gameplay backdrop (grid and scrolling back waves) and the border fog without
+# allocating surfaces per frame. fog edges are pre-rendered once per phase of their cycle.
+class BackgroundRenderer:
+    def __init__(self, size, bg_color, grid_color, back_color, fog_color):
+        self.size = tuple(size)
+        self.bg_color = bg_color
+        self.grid_color = grid_color
+        self.back_color = back_color
+        self.fog_color = fog_color
+        self.base = pygame.Surface(self.size)
+        self.grid_mask = None
+        self.fog_cache = {}
+        self.fog_layers = 2
+        self.back_waves = True
+        self.build_wave_tables()
+
+    def set_detail(self, fog_layers, back_waves):
+        if fog_layers != self.fog_layers:
+            self.fog_layers = fog_layers
+            self.fog_cache = {}
+        self.back_waves = back_waves
+
+    def build_wave_tables(self):
+        w, h = self.size
+        self.wave_x = []
+        self.wave_y_top = []
+        self.wave_y_bottom = []
+        for q in range(WAVE_STEPS):
+            phase = q / WAVE_STEPS * math.pi * 2
+            self.wave_x.append([w - (w / 30 * (i + 1) + math.sin(phase + i * 12) * 8) for i in range(29)])
+            ys = [(16 + math.sin(phase + i) * 4) * 3 for i in range(29)]
+            self.wave_y_top.append(ys)
+            # the bottom band mirrors the top one around the last row
+            self.wave_y_bottom.append([h - 1 - y for y in ys])
+
+    def wave_index(self, phase):
+        return int(phase % (math.pi * 2) / (math.pi * 2) * WAVE_STEPS) % WAVE_STEPS
+
+    # which grid lines are lit, columns first then rows
+    def grid_lines(self, game_time):
+        w, h = self.size
+        mask = tuple(abs(math.sin(game_time * 0.01 + x * 0.1)) > 0.5 for x in range(0, w, GRID_SPACING))
+        return mask + tuple(abs(math.sin(game_time * 0.01 + y * 0.1)) > 0.5 for y in range(0, h, GRID_SPACING))
+
+    # rects of the grid lines lit in one mask and not in the other
+    def changed_lines(self, old, new):
+        w, h = self.size
+        columns = len(range(0, w, GRID_SPACING))
+        rects = []
+        for i, (was_lit, lit) in enumerate(zip(old, new)):
+            if was_lit != lit:
+                if i < columns:
+                    rects.append(pygame.Rect(i * GRID_SPACING, 0, 1, h))
+                else:
+                    rects.append(pygame.Rect(0, (i - columns) * GRID_SPACING, w, 1))
+        return rects
+
+    # area: only that part of the base is drawn to surf
+    def render_base(self, surf, game_time, area=None):
+        w, h = self.size
+        mask = self.grid_lines(game_time)
+        if mask != self.grid_mask:
+            self.grid_mask = mask
+            self.base.fill(self.bg_color)
+            for i, x in enumerate(range(0, w, GRID_SPACING)):
+                if mask[i]:
+                    pygame.draw.line(self.base, self.grid_color, (x, 0), (x, h), 1)
+            offset = len(range(0, w, GRID_SPACING))
+            for i, y in enumerate(range(0, h, GRID_SPACING)):
+                if mask[offset + i]:
+                    pygame.draw.line(self.base, self.grid_color, (0, y), (w, y), 1)
+        if area:
+            surf.blit(self.base, area, area)
+        else:
+            surf.blit(self.base, (0, 0))
+
+    def render_back(self, surf, game_time, scroll):
+        w, h = self.size
+        self.render_base(surf, game_time)
+        if not self.back_waves:
+            return
+        xs = self.wave_x[self.wave_index((game_time - scroll[0] * 0.5) / 10)]
+        y_index = self.wave_index(game_time / 10)
+        top = [[w, 48]] + list(zip(xs, self.wave_y_top[y_index])) + [[0, 48], [0, 0], [w, 0]]
+        pygame.draw.polygon(surf, self.back_color, top)
+        bottom = [[w, h - 49]] + list(zip(xs, self.wave_y_bottom[y_index])) + [[0, h - 49], [0, h - 1], [w, h - 1]]
+        pygame.draw.polygon(surf, self.back_color, bottom)
+
+    def fog_points(self, t):
+        w = self.size[0]
+        points = [[0, 16]]
+        points += [[w / 30 * (i + 1) + math.sin((t + i * 120) / 4) * 8, 16 + math.sin((t + i * 10) / 10) * 4] for i in range(29)]
+        points += [[w, 16], [w, 0], [0, 0]]
+        return points
+
+    # stacks two fog layers into one per-pixel alpha surface. the layers are multiplied as
+    # transmission masks so overlaps darken exactly like two separate FOG_ALPHA blits would.
+    def composite(self, size, layers):
+        transmission = pygame.Surface(size, pygame.SRCALPHA)
+        transmission.fill((0, 0, 0, 255))
+        for layer, pos in layers:
+            transmission.blit(layer, pos, special_flags=pygame.BLEND_RGBA_MULT)
+        surf = pygame.Surface(size, pygame.SRCALPHA)
+        surf.fill(self.fog_color + (255,))
+        surf.blit(transmission, (0, 0), special_flags=pygame.BLEND_RGBA_SUB)
+        return surf
+
+    def build_fog(self, t):
+        w, h = self.size
+        strip = pygame.Surface((w, FOG_DEPTH), pygame.SRCALPHA)
+        strip.fill((255, 255, 255, 255))
+        pygame.draw.polygon(strip, (255, 255, 255, 255 - FOG_ALPHA), self.fog_points(t))
+        top_layers = [(pygame.transform.flip(strip, True, False), (0, -6)), (strip, (0, 0))]
+        top = self.composite((w, FOG_DEPTH), top_layers[-self.fog_layers:])
+        side = pygame.transform.scale(pygame.transform.rotate(strip, 90), (FOG_DEPTH, h))
+        left_layers = [(pygame.transform.flip(side, False, True), (-6, 0)), (side, (0, 0))]
+        left = self.composite((FOG_DEPTH, h), left_layers[-self.fog_layers:])
+        return [
+            (top, (0, 0)),
+            (pygame.transform.flip(top, False, True), (0, h - FOG_DEPTH)),
+            (left, (0, 0)),
+            (pygame.transform.flip(left, True, True), (w - FOG_DEPTH, 0)),
+        ]
+
+    def render_fog(self, surf, game_time):
+        phase = int(game_time % FOG_CYCLE / FOG_CYCLE * FOG_PHASES) % FOG_PHASES
+        if phase not in self.fog_cache:
+            self.fog_cache[phase] = self.build_fog(phase / FOG_PHASES * FOG_CYCLE)
+        for fog_surf, pos in self.fog_cache[phase]:
+            surf.blit(fog_surf, pos)
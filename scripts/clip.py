@@ -1,8 +1,10 @@
 import pygame
 
+# the part of surf inside the rect (clamped to surf) as a subsurface, nothing is copied and
+# the result shares its pixels with surf
+def view(surf,x,y,x_size,y_size):
+    return surf.subsurface(pygame.Rect(x,y,x_size,y_size).clip(surf.get_rect()))
+
+# standalone copy of only the requested region
 def clip(surf,x,y,x_size,y_size):
-    handle_surf = surf.copy()
-    clipR = pygame.Rect(x,y,x_size,y_size)
-    handle_surf.set_clip(clipR)
-    image = surf.subsurface(handle_surf.get_clip())
-    return image.copy()
+    return view(surf,x,y,x_size,y_size).copy()
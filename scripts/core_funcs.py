@@ -1,4 +1,5 @@
 import pygame, math
+from .clip import clip, view
 
 def read_f(path):
     f = open(path, 'r')
@@ -19,13 +20,6 @@ def swap_color(img,old_c,new_c):
     surf.blit(img,(0,0))
     return surf
 
-def clip(surf,x,y,x_size,y_size):
-    handle_surf = surf.copy()
-    clipR = pygame.Rect(x,y,x_size,y_size)
-    handle_surf.set_clip(clipR)
-    image = surf.subsurface(handle_surf.get_clip())
-    return image.copy()
-
 def rect_corners(points):
     point_1 = points[0]
     point_2 = points[1]
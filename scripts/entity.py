@@ -4,6 +4,26 @@ import pygame
 
 from .core_funcs import *
 
+TRANSFORM_CACHE_SIZE = 256
+ROTATION_STEP = 5
+
+# transformed entity images shared by all entities, keyed by (source frame, flip, scale,
+# quantized rotation, opacity). the oldest entry is dropped once the cache is full.
+transform_cache = {}
+
+def transform_img(img, flip, scale, rotation, opacity):
+    if scale != (1, 1):
+        img = pygame.transform.scale(img, (int(scale[0] * img.get_width()), int(scale[1] * img.get_height())))
+    if any(flip):
+        img = pygame.transform.flip(img, flip[0], flip[1])
+    if rotation:
+        img = pygame.transform.rotate(img, rotation)
+    if opacity != 255:
+        # the source frame may still be the untransformed animation frame
+        img = img.copy()
+        img.set_alpha(opacity)
+    return img
+
 def collision_list(obj, obj_list):
     hit_list = []
     for r in obj_list:
@@ -31,19 +51,21 @@ class Entity:
     @property
     def img(self):
         if not self.active_animation:
-            img = self.current_image
+            src = self.current_image
         else:
-            self.set_image(self.active_animation.img)
-            img = self.current_image
-        if self.scale != [1, 1]:
-            img = pygame.transform.scale(img, (int(self.scale[0] * self.image_base_dimensions[0]), int(self.scale[1] * self.image_base_dimensions[1])))
-        if any(self.flip):
-            img = pygame.transform.flip(self.current_image, self.flip[0], self.flip[1])
-        if self.rotation:
-            img = pygame.transform.rotate(img, self.rotation)
-        if self.opacity != 255:
-            img.set_alpha(self.opacity)
-        return img
+            src = self.active_animation.img
+            self.image_base_dimensions = list(src.get_size())
+        scale = tuple(self.scale)
+        flip = (bool(self.flip[0]), bool(self.flip[1]))
+        rotation = round(self.rotation / ROTATION_STEP) * ROTATION_STEP % 360
+        if (scale == (1, 1)) and (flip == (False, False)) and (not rotation) and (self.opacity == 255):
+            return src
+        key = (src, flip, scale, rotation, self.opacity)
+        if key not in transform_cache:
+            if len(transform_cache) >= TRANSFORM_CACHE_SIZE:
+                del transform_cache[next(iter(transform_cache))]
+            transform_cache[key] = transform_img(src, flip, scale, rotation, self.opacity)
+        return transform_cache[key]
 
     @property
     def rect(self):
@@ -134,16 +156,17 @@ class Entity:
         return directions
 
     def render(self, surf, offset=(0, 0)):
+        img = self.img
         offset = list(offset)
         if self.active_animation:
-            offset[0] += self.active_animation.data.config['offset'][0]
-            offset[1] += self.active_animation.data.config['offset'][1]
+            offset[0] += self.active_animation.offset[0]
+            offset[1] += self.active_animation.offset[1]
         if self.centered:
-            offset[0] += self.img.get_width() // 2
-            offset[1] += self.img.get_height() // 2
-        if self.active_animation and self.active_animation.data.config['outline']:
-            outline(surf, self.img, ((self.pos[0] - offset[0]) // 1, (self.pos[1] - offset[1] - self.height) // 1), self.active_animation.data.config['outline'])
-        surf.blit(self.img, ((self.pos[0] - offset[0]) // 1, (self.pos[1] - offset[1] - self.height) // 1))
+            offset[0] += img.get_width() // 2
+            offset[1] += img.get_height() // 2
+        if self.active_animation and self.active_animation.outline:
+            outline(surf, img, ((self.pos[0] - offset[0]) // 1, (self.pos[1] - offset[1] - self.height) // 1), self.active_animation.outline)
+        surf.blit(img, ((self.pos[0] - offset[0]) // 1, (self.pos[1] - offset[1] - self.height) // 1))
 
     def update(self, dt):
         if self.active_animation:
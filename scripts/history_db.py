@@ -0,0 +1,258 @@
+import os
+import json
+import sqlite3
+import argparse
+
+from . import history_store
+
+DB_PATH = 'data/game_history.db'
+SCHEMA_VERSION = 1
+# field names used by older versions of the game
+LEGACY_FIELDS = {
+    'enemies_defeated': 'threats_neutralized',
+    'mana_collected': 'firewalls_collected',
+    'data_collected': 'firewalls_collected',
+    'deaths': 'breaches',
+}
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    player_name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    duration_seconds INTEGER NOT NULL,
+    duration_formatted TEXT NOT NULL,
+    threats_neutralized INTEGER NOT NULL DEFAULT 0,
+    firewalls_collected INTEGER NOT NULL DEFAULT 0,
+    breaches INTEGER NOT NULL DEFAULT 0,
+    final_level TEXT,
+    levels_completed TEXT NOT NULL DEFAULT '[]',
+    clear_times TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS clears (
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    level TEXT NOT NULL,
+    -- NULL for sessions from before clear times were recorded
+    seconds INTEGER
+);
+CREATE INDEX IF NOT EXISTS sessions_player ON sessions (player_name);
+CREATE INDEX IF NOT EXISTS sessions_date ON sessions (date);
+CREATE INDEX IF NOT EXISTS sessions_level ON sessions (final_level, duration_seconds);
+CREATE INDEX IF NOT EXISTS sessions_level_threats ON sessions (final_level, threats_neutralized);
+CREATE INDEX IF NOT EXISTS sessions_duration ON sessions (duration_seconds);
+CREATE INDEX IF NOT EXISTS sessions_threats ON sessions (threats_neutralized);
+CREATE INDEX IF NOT EXISTS clears_level ON clears (level, seconds);
+'''
+COLUMNS = ['player_name', 'date', 'duration_seconds', 'duration_formatted', 'threats_neutralized',
+           'firewalls_collected', 'breaches', 'final_level', 'levels_completed', 'clear_times']
+
+def previous_level(name):
+    prefix, number = name.rsplit('_', 1)
+    return prefix + '_' + str(int(number) - 1)
+
+# a session record as the game writes it now, whatever version wrote it
+def normalize(record):
+    session = dict(record)
+    if 'clear_times' not in session:
+        # older versions recorded the level entered after each clear instead of the cleared
+        # one, and no clear times
+        session['levels_completed'] = [previous_level(level) for level in session.get('levels_completed', [])]
+    for old, new in LEGACY_FIELDS.items():
+        if old in session:
+            value = session.pop(old)
+            session.setdefault(new, value)
+    for name in ['threats_neutralized', 'firewalls_collected', 'breaches', 'duration_seconds']:
+        session[name] = int(session.get(name) or 0)
+    session.setdefault('duration_formatted', '{}s'.format(session['duration_seconds']))
+    session.setdefault('final_level', None)
+    session.setdefault('levels_completed', [])
+    session.setdefault('clear_times', {})
+    return session
+
+def session_from_row(row):
+    session = dict(row)
+    session.pop('id', None)
+    session['levels_completed'] = json.loads(session['levels_completed'])
+    session['clear_times'] = json.loads(session['clear_times'])
+    return session
+
+# session history in sqlite. same interface as history_store.HistoryLog (count, recent,
+# append) for the history screen, plus leaderboard queries that page through the indexes
+# instead of loading the whole history.
+class HistoryDB:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        # readers on the main thread don't wait for a write in progress
+        self.db.execute('PRAGMA journal_mode = WAL')
+        # sessions are written through their own connection, see write
+        self.write_db = None
+        # user_version is only set by import_records, in the same transaction as the import,
+        # so a database whose import failed is still new the next time it is opened
+        self.created = self.db.execute('PRAGMA user_version').fetchone()[0] == 0
+        if self.created:
+            self.db.executescript(SCHEMA)
+        # count and newest id at the same moment, queries only see rows up to that id and
+        # queued sessions past it come from the pending list (see history_store.pending_entry)
+        self.total = None
+        self.last_id = None
+        self.pending = []
+
+    def close(self):
+        if self.write_db:
+            self.write_db.close()
+        self.db.close()
+
+    def insert(self, db, record, session_id=None):
+        session = normalize(record)
+        values = [session_id] + [session[name] for name in COLUMNS]
+        values[1 + COLUMNS.index('levels_completed')] = json.dumps(session['levels_completed'])
+        values[1 + COLUMNS.index('clear_times')] = json.dumps(session['clear_times'])
+        # worked out before the session row goes in, a record that fails here leaves nothing
+        clears = [(level, session['clear_times'].get(level)) for level in session['levels_completed']]
+        session_id = db.execute('INSERT INTO sessions (id, {}) VALUES (?, {})'.format(', '.join(COLUMNS), ', '.join('?' * len(COLUMNS))), values).lastrowid
+        db.executemany('INSERT INTO clears (session_id, level, seconds) VALUES (?, ?, ?)', [(session_id,) + clear for clear in clears])
+
+    # registers a record that is about to be written, see HistoryLog.added
+    def added(self, record):
+        entry = history_store.pending_entry(record)
+        self.pending.append(entry)
+        return entry
+
+    # may run on another thread (one at a time), the main thread keeps self.db for queries.
+    # the id is picked before the insert, so a snapshot taken at any point either has the
+    # row or sees an id past its newest one
+    def write(self, entry):
+        if not self.write_db:
+            self.write_db = sqlite3.connect(self.path, check_same_thread=False)
+        with self.write_db:
+            entry['id'] = self.write_db.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM sessions').fetchone()[0]
+            self.insert(self.write_db, entry['record'], entry['id'])
+        entry['written'] = True
+
+    def append(self, record):
+        self.write(self.added(record))
+
+    def settle(self):
+        for entry in [entry for entry in self.pending if entry['written'] or entry['failed']]:
+            self.pending.remove(entry)
+            if entry['written'] and (self.last_id is not None) and (entry['id'] > self.last_id):
+                # every id up to this one is committed, there is a single writer
+                self.total += 1
+                self.last_id = entry['id']
+
+    def queued(self):
+        return [entry['record'] for entry in reversed(self.pending)
+                if (not entry['failed']) and ((entry['id'] is None) or (self.last_id is None) or (entry['id'] > self.last_id))]
+
+    # records that aren't sessions (a damaged or hand-edited file) are skipped, otherwise the
+    # import would fail on them every time. returns how many were imported
+    def import_records(self, records):
+        imported = 0
+        with self.db:
+            for record in records:
+                try:
+                    self.insert(self.db, record)
+                    imported += 1
+                except (ValueError, TypeError, AttributeError, KeyError, sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError):
+                    pass
+            self.db.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+        self.created = False
+        self.total = self.last_id = None
+        return imported
+
+    def count(self):
+        self.settle()
+        if self.total is None:
+            self.total, self.last_id = self.db.execute('SELECT COUNT(*), COALESCE(MAX(id), 0) FROM sessions').fetchone()
+            # sessions that landed meanwhile
+            self.settle()
+        return self.total + len(self.queued())
+
+    # newest first, like HistoryLog.recent, queued sessions first
+    def recent(self, start, amount):
+        self.count()
+        queued = self.queued()
+        rows = self.db.execute('SELECT * FROM sessions WHERE id <= ? ORDER BY id DESC LIMIT ? OFFSET ?', (self.last_id, amount, max(0, start - len(queued))))
+        return (queued[start:] + [session_from_row(row) for row in rows])[:amount]
+
+    def top_threats(self, amount=10, start=0, level=None):
+        if level:
+            rows = self.db.execute('SELECT * FROM sessions WHERE final_level = ? ORDER BY threats_neutralized DESC LIMIT ? OFFSET ?', (level, amount, start))
+        else:
+            rows = self.db.execute('SELECT * FROM sessions ORDER BY threats_neutralized DESC LIMIT ? OFFSET ?', (amount, start))
+        return [session_from_row(row) for row in rows]
+
+    # seconds from the start of the session to clearing the level
+    def fastest_clears(self, level, amount=10, start=0):
+        rows = self.db.execute('''SELECT sessions.player_name, sessions.date, clears.level, clears.seconds FROM clears
+                                  JOIN sessions ON sessions.id = clears.session_id
+                                  WHERE clears.level = ? AND clears.seconds IS NOT NULL
+                                  ORDER BY clears.seconds LIMIT ? OFFSET ?''', (level, amount, start))
+        return [dict(row) for row in rows]
+
+    def player_stats(self, player_name):
+        row = self.db.execute('''SELECT player_name, COUNT(*) AS sessions, SUM(duration_seconds) AS total_seconds,
+                                 SUM(threats_neutralized) AS threats_neutralized, MAX(threats_neutralized) AS best_threats,
+                                 SUM(firewalls_collected) AS firewalls_collected, SUM(breaches) AS breaches,
+                                 MAX(date) AS last_played FROM sessions WHERE player_name = ?''', (player_name,)).fetchone()
+        if not row['sessions']:
+            return None
+        stats = dict(row)
+        stats['levels_cleared'] = [r[0] for r in self.db.execute('''SELECT DISTINCT clears.level FROM clears
+                                                                    JOIN sessions ON sessions.id = clears.session_id
+                                                                    WHERE sessions.player_name = ? ORDER BY clears.level''', (player_name,))]
+        return stats
+
+def load_records(path):
+    if path.endswith('.jsonl'):
+        return history_store.read_records(path)
+    return history_store.load_legacy(path)
+
+# fills a new database from the first history file that exists (the JSON Lines log, or the
+# old game_history.json list). without any the database is marked as migrated all the same
+def migrate(db, paths):
+    for path in paths:
+        if os.path.exists(path):
+            return path, db.import_records(load_records(path))
+    db.import_records([])
+    return None, 0
+
+def print_rows(rows, columns, start=0):
+    for i, row in enumerate(rows):
+        print('{:>3}. '.format(start + i + 1) + '  '.join(str(row.get(name)) for name in columns))
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Queries on the sqlite session history')
+    arg_parser.add_argument('--path', default=DB_PATH)
+    # options of the leaderboard commands, given after the command name
+    paging = argparse.ArgumentParser(add_help=False)
+    paging.add_argument('--limit', type=int, default=10)
+    paging.add_argument('--page', type=int, default=0)
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+    migrate_parser = commands.add_parser('migrate', help='import a history file into the database')
+    migrate_parser.add_argument('source', nargs='?', default='data/game_history.json')
+    top_parser = commands.add_parser('top', parents=[paging], help='sessions with the most threats neutralized')
+    top_parser.add_argument('--level')
+    fastest_parser = commands.add_parser('fastest', parents=[paging], help='fastest clears of a level')
+    fastest_parser.add_argument('level')
+    player_parser = commands.add_parser('player', help='totals for one player')
+    player_parser.add_argument('name')
+    args = arg_parser.parse_args()
+
+    history = HistoryDB(args.path)
+    start = args.page * args.limit if args.command in ('top', 'fastest') else 0
+    if args.command == 'migrate':
+        if history.count():
+            print('{} already holds {} sessions, not importing'.format(args.path, history.count()))
+        else:
+            print('Imported {} sessions from {}'.format(migrate(history, [args.source])[1], args.source))
+    elif args.command == 'top':
+        print_rows(history.top_threats(args.limit, start, args.level), ['player_name', 'threats_neutralized', 'final_level', 'date'], start)
+    elif args.command == 'fastest':
+        print_rows(history.fastest_clears(args.level, args.limit, start), ['player_name', 'seconds', 'date'], start)
+    elif args.command == 'player':
+        stats = history.player_stats(args.name)
+        print(json.dumps(stats, indent=2, ensure_ascii=False) if stats else 'No sessions for ' + args.name)
+    history.close()
@@ -0,0 +1,236 @@
+import os
+import json
+import argparse
+
+HISTORY_PATH = 'data/game_history.jsonl'
+# the single JSON list written by older versions
+LEGACY_PATH = 'data/game_history.json'
+BLOCK_SIZE = 16384
+
+def encode(record):
+    return (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+def parse(line):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line.decode('utf-8'))
+    except ValueError:
+        # torn line from an interrupted write, compaction drops it
+        return None
+
+def read_records(path):
+    records = []
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            for line in f:
+                record = parse(line)
+                if record is not None:
+                    records.append(record)
+    return records
+
+# replaces path with the records in one step, readers see the old file or the new one
+def write_records(path, records):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        for record in records:
+            f.write(encode(record))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+def load_legacy(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+    if not isinstance(records, list):
+        raise ValueError('not a list of sessions')
+    return records
+
+# the legacy list for a conversion. one that can't be read is renamed to .bad and the log
+# starts empty, so the conversion isn't retried (and failing) on every write
+def read_legacy(path):
+    try:
+        return load_legacy(path)
+    except (OSError, ValueError) as e:
+        print('Could not read {} ({}), moving it to {}.bad'.format(path, e, path))
+        try:
+            os.replace(path, path + '.bad')
+        except OSError:
+            pass
+        return []
+
+# a record handed to a store before it is written, maybe by another thread. the writer sets
+# 'written' (or the store's position of the record) as it goes, the main thread drops the
+# entry once it is written or has failed (settle), until then recent() and count() include it
+def pending_entry(record):
+    return {'record': record, 'end': None, 'id': None, 'written': False, 'failed': False}
+
+# session history as JSON Lines, one session per line, oldest first. a session is stored
+# with a single append, so ending one costs the same however long the history is. the
+# history screen shows the newest sessions, so records are parsed backwards from the end
+# of the file a block at a time and only as far as the screen has scrolled. while there is
+# no log yet the legacy list is read as it is, the first write converts it, so runs that
+# never save a session (replays, benchmarks) never write anything.
+#
+# the tail and the count each cover the file up to the size it had when they started
+# (self.end, self.counted). a queued record whose line ends past that size is shown from
+# the pending list, one inside it is already read from the file.
+class HistoryLog:
+    def __init__(self, path=HISTORY_PATH, legacy=LEGACY_PATH):
+        self.path = path
+        self.legacy = legacy
+        # newest first, parsed so far
+        self.records = []
+        # end of the part of the file that hasn't been parsed yet, None before the first read
+        self.position = None
+        self.end = None
+        self.partial = b''
+        self.total = None
+        self.counted = None
+        # oldest first
+        self.pending = []
+
+    def uses_legacy(self):
+        return bool(self.legacy) and (not os.path.exists(self.path)) and os.path.exists(self.legacy)
+
+    def start(self):
+        if self.position is not None:
+            return
+        if self.uses_legacy():
+            try:
+                records = load_legacy(self.legacy)
+            except (OSError, ValueError):
+                print('Could not read ' + self.legacy + ', starting an empty history')
+                records = []
+            self.records = list(reversed(records))
+            # everything the first write appends comes after the converted list
+            self.position = self.end = self.counted = 0
+            self.total = len(records)
+        else:
+            self.position = self.end = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def settle(self):
+        for entry in [entry for entry in self.pending if entry['written'] or entry['failed']]:
+            self.pending.remove(entry)
+            if entry['failed']:
+                continue
+            if (self.end is not None) and (entry['end'] > self.end):
+                self.records.insert(0, entry['record'])
+            if (self.total is not None) and (entry['end'] > self.counted):
+                self.total += 1
+
+    # pending records that aren't in the file up to size, newest first
+    def queued(self, size):
+        return [entry['record'] for entry in reversed(self.pending)
+                if (not entry['failed']) and ((entry['end'] is None) or (size is None) or (entry['end'] > size))]
+
+    # scans the whole file the first time, only the history screen asks
+    def count(self):
+        self.settle()
+        if (self.total is None) and self.uses_legacy():
+            self.start()
+        if self.total is None:
+            total = 0
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            if size:
+                with open(self.path, 'rb') as f:
+                    while f.tell() < size:
+                        # an unfinished last line (torn, or being written) isn't a session
+                        total += f.read(min(BLOCK_SIZE, size - f.tell())).count(b'\n')
+            self.total = total
+            self.counted = size
+            # records that landed during the scan
+            self.settle()
+        return self.total + len(self.queued(self.counted))
+
+    def read_back(self):
+        self.start()
+        if self.position == 0:
+            if not self.partial:
+                return False
+            lines = [self.partial]
+            self.partial = b''
+        else:
+            first = self.position == self.end
+            start = max(0, self.position - BLOCK_SIZE)
+            with open(self.path, 'rb') as f:
+                f.seek(start)
+                block = f.read(self.position - start)
+            self.position = start
+            lines = (block + self.partial).split(b'\n')
+            if first:
+                # an unfinished last line (torn, or being written) isn't a session, like in count
+                lines.pop()
+            # the first piece may be the end of a line that starts in the previous block
+            self.partial = lines.pop(0) if lines else b''
+        for line in reversed(lines):
+            record = parse(line)
+            if record is not None:
+                self.records.append(record)
+        return True
+
+    # newest first: recent(0, 8) are the last 8 sessions
+    def recent(self, start, amount):
+        self.start()
+        self.settle()
+        queued = self.queued(self.end)
+        while (len(queued) + len(self.records) < start + amount) and self.read_back():
+            pass
+        return (queued + self.records[:start + amount])[start:start + amount]
+
+    # registers a record that is about to be written, returns its pending entry for write
+    def added(self, record):
+        entry = pending_entry(record)
+        self.pending.append(entry)
+        return entry
+
+    def write(self, entry):
+        if self.uses_legacy():
+            import_json(self.legacy, self.path)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        data = encode(entry['record'])
+        # unbuffered append mode: the line goes out in a single write at the end of the file.
+        # a crash can only leave a torn last line, which readers skip
+        with open(self.path, 'ab+', buffering=0) as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    # close a torn line so this record starts a line of its own
+                    data = b'\n' + data
+            entry['end'] = size + len(data)
+            f.write(data)
+            entry['written'] = True
+            os.fsync(f.fileno())
+
+    def append(self, record):
+        self.write(self.added(record))
+
+# rewrites the log without unreadable lines, optionally keeping only the newest sessions.
+# without a log yet it converts the legacy list
+def compact(path=HISTORY_PATH, keep=None, legacy=LEGACY_PATH):
+    if (not os.path.exists(path)) and legacy and os.path.exists(legacy):
+        records = read_legacy(legacy)
+    else:
+        records = read_records(path)
+    dropped = 0
+    if keep is not None:
+        dropped = max(0, len(records) - keep)
+        records = records[dropped:]
+    before = os.path.getsize(path) if os.path.exists(path) else 0
+    write_records(path, records)
+    print('Compacted {}: {} sessions, {} dropped, {} -> {} bytes'.format(path, len(records), dropped, before, os.path.getsize(path)))
+
+# one-time conversion of the old game_history.json (a single JSON array)
+def import_json(json_path, path=HISTORY_PATH):
+    write_records(path, read_legacy(json_path))
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Maintenance for the session history log')
+    arg_parser.add_argument('command', choices=['compact'])
+    arg_parser.add_argument('--path', default=HISTORY_PATH)
+    arg_parser.add_argument('--legacy', default=LEGACY_PATH, help='old JSON history, converted when there is no log yet')
+    arg_parser.add_argument('--keep', type=int, help='keep only this many of the newest sessions')
+    args = arg_parser.parse_args()
+    compact(args.path, args.keep, args.legacy)
@@ -0,0 +1,54 @@
+import queue
+import threading
+
+MAX_PENDING = 64
+
+# writes finished sessions to a history store (HistoryLog or HistoryDB) on a background
+# thread, so ending a session never waits for the disk. the store lists the session as
+# pending right away (store.added), only store.write runs on the worker; a failed write
+# drops it from the pending list again instead of leaving it on screen. the queue is
+# bounded: a session that doesn't fit is kept aside and handed over by the next append or
+# by flush(), which waits until everything is written and must run before exiting.
+class HistoryWriter:
+    def __init__(self, store, max_pending=MAX_PENDING):
+        self.store = store
+        self.queue = queue.Queue(max_pending)
+        self.overflow = []
+        self.thread = None
+
+    def run(self):
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                return
+            try:
+                self.store.write(entry)
+            except Exception as e:
+                # once the record is in the file (a failed fsync) it stays listed
+                entry['failed'] = not entry['written']
+                print('Could not save session history: ' + str(e))
+
+    def hand_over(self):
+        while self.overflow:
+            try:
+                self.queue.put_nowait(self.overflow[0])
+            except queue.Full:
+                return
+            self.overflow.pop(0)
+
+    def append(self, record):
+        if not self.thread:
+            self.thread = threading.Thread(target=self.run, name='history-writer', daemon=True)
+            self.thread.start()
+        self.overflow.append(self.store.added(record))
+        self.hand_over()
+
+    def flush(self):
+        if not self.thread:
+            return
+        for entry in self.overflow:
+            self.queue.put(entry)
+        self.overflow = []
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
@@ -0,0 +1,66 @@
+import math
+
+import pygame
+
+# downscale factor of the light map for each quality level, 0 turns the pass off
+LIGHT_QUALITY = {
+    'off': 0,
+    'low': 8,
+    'medium': 4,
+    'high': 2,
+}
+CIRCLE_CACHE_SIZE = 512
+
+# glows are accumulated additively into a low resolution buffer which is upsampled and
+# added to the frame once, so the full resolution blend cost no longer grows with the
+# number of lights. radii are quantized to light map pixels so circles can be cached.
+class LightMap:
+    def __init__(self, size, quality='medium', intensity=1):
+        self.size = tuple(size)
+        # lights past this many in a frame are dropped, None for no limit
+        self.max_lights = None
+        self.set_quality(quality, intensity)
+
+    def set_quality(self, quality, intensity=None):
+        self.quality = quality
+        if intensity is not None:
+            self.intensity = intensity
+        self.scale = LIGHT_QUALITY[quality]
+        self.circles = {}
+        self.lights = 0
+        if self.scale:
+            w = math.ceil(self.size[0] / self.scale)
+            h = math.ceil(self.size[1] / self.scale)
+            self.buffer = pygame.Surface((w, h))
+            self.upscaled = pygame.Surface((w * self.scale, h * self.scale))
+
+    def circle(self, radius, color):
+        key = (radius, color)
+        if key not in self.circles:
+            if len(self.circles) >= CIRCLE_CACHE_SIZE:
+                self.circles.clear()
+            surf = pygame.Surface((radius * 2 + 1, radius * 2 + 1))
+            pygame.draw.circle(surf, color, (radius, radius), radius)
+            self.circles[key] = surf
+        return self.circles[key]
+
+    def add(self, loc, radius, color):
+        if (not self.scale) or (self.lights == self.max_lights):
+            return
+        i = self.intensity
+        color = (min(255, int(color[0] * i)), min(255, int(color[1] * i)), min(255, int(color[2] * i)))
+        if color == (0, 0, 0):
+            return
+        r = max(1, round(radius / self.scale))
+        pos = (math.floor(loc[0] / self.scale) - r, math.floor(loc[1] / self.scale) - r)
+        if not self.lights:
+            self.buffer.fill((0, 0, 0))
+        self.buffer.blit(self.circle(r, color), pos, special_flags=pygame.BLEND_RGB_ADD)
+        self.lights += 1
+
+    def apply(self, surf):
+        if not self.lights:
+            return
+        pygame.transform.smoothscale(self.buffer, self.upscaled.get_size(), self.upscaled)
+        surf.blit(self.upscaled, (0, 0), special_flags=pygame.BLEND_RGB_ADD)
+        self.lights = 0
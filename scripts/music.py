@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+CROSSFADE_MS = 1000
+
+# background music on two mixer channels, so the outgoing track can fade out while the
+# next one fades in (pygame.mixer.music streams a single track and load() opens the file
+# on the calling thread). tracks are read and decoded on a worker thread by prepare(),
+# play() only starts a track once it is ready and never touches files itself. when
+# disabled (no audio, no channels) every call does nothing.
+class MusicController:
+    def __init__(self, channels, enabled=True, volume=1.0):
+        self.channels = list(channels)
+        self.enabled = enabled and (len(self.channels) >= 2)
+        self.volume = volume
+        self.tracks = {}
+        self.worker = None
+        self.active = 0
+        self.wanted = None
+        self.fade_ms = 0
+
+    def prepare(self, path):
+        if (not self.enabled) or (path in self.tracks):
+            return
+        if not self.worker:
+            self.worker = ThreadPoolExecutor(1)
+        self.tracks[path] = self.worker.submit(pygame.mixer.Sound, path)
+
+    def ready(self, path):
+        future = self.tracks.get(path)
+        return bool(future) and future.done() and (future.exception() is None)
+
+    # crossfades to the track as soon as it has been prepared (a missing or unreadable
+    # file stays silent, like before)
+    def play(self, path, fade_ms=CROSSFADE_MS):
+        if not self.enabled:
+            return
+        self.prepare(path)
+        self.wanted = path
+        self.fade_ms = fade_ms
+        self.update()
+
+    def update(self):
+        if (not self.wanted) or (not self.ready(self.wanted)):
+            return
+        sound = self.tracks[self.wanted].result()
+        sound.set_volume(self.volume)
+        self.stop(self.channels[self.active], self.fade_ms)
+        self.active = 1 - self.active
+        self.channels[self.active].play(sound, loops=-1, fade_ms=self.fade_ms)
+        self.wanted = None
+
+    def stop(self, channel, fade_ms):
+        if fade_ms:
+            channel.fadeout(fade_ms)
+        else:
+            channel.stop()
+
+    def fadeout(self, time_ms):
+        if not self.enabled:
+            return
+        self.wanted = None
+        self.stop(self.channels[self.active], time_ms)
+
+    def set_volume(self, volume):
+        self.volume = volume
+        for future in self.tracks.values():
+            if future.done() and (future.exception() is None):
+                future.result().set_volume(volume)
@@ -3,6 +3,9 @@ import random
 
 import pygame
 
+from .atlas import atlas
+from .asset_cache import asset_cache
+
 global e_colorkey
 e_colorkey = (0, 0, 0)
 global particle_images
@@ -38,9 +41,7 @@ def load_particle_images(path):
         img_list = particle_file_sort(img_list)
         images = []
         for img in img_list:
-            images.append(pygame.image.load(path + '/' + folder + '/' + img).convert())
-        for img in images:
-            img.set_colorkey(e_colorkey)
+            images.append(atlas.add(asset_cache.load_image(path + '/' + folder + '/' + img).convert()))
         particle_images[folder] = images.copy()
         #except:
         #    pass
@@ -0,0 +1,40 @@
+import pygame
+
+# the window is opened with pygame.SCALED at the logical size of the low-res frame, so
+# presenting is a plain copy and SDL does the upscale. zoom scales a centered view of the
+# frame straight into the window surface, so nothing is allocated per frame.
+class Presenter:
+    def __init__(self, screen, display):
+        self.screen = screen
+        self.display = display
+        self.fade_surf = pygame.Surface(screen.get_size())
+        self.zoom_rect = None
+        self.zoom_view = None
+
+    def zoomed_view(self, zoom):
+        w, h = self.display.get_size()
+        size = [min(w, int(w / zoom)), min(h, int(h / zoom))]
+        rect = pygame.Rect((w - size[0]) // 2, (h - size[1]) // 2, size[0], size[1])
+        if rect != self.zoom_rect:
+            self.zoom_rect = rect
+            self.zoom_view = self.display.subsurface(rect)
+        return self.zoom_view
+
+    def present(self, zoom=1, fade=0):
+        if zoom == 1:
+            self.screen.blit(self.display, (0, 0))
+        else:
+            pygame.transform.scale(self.zoomed_view(zoom), self.screen.get_size(), self.screen)
+        if fade > 0:
+            self.fade_surf.set_alpha(fade)
+            self.screen.blit(self.fade_surf, (0, 0))
+        pygame.display.update()
+
+    # copies only the regions that changed since the last present. an empty list leaves the
+    # window untouched, so an idle screen costs no blit and no flip
+    def present_rects(self, rects):
+        if not rects:
+            return
+        for rect in rects:
+            self.screen.blit(self.display, rect, rect)
+        pygame.display.update(rects)
@@ -0,0 +1,178 @@
+import math
+import time
+import bisect
+from collections import deque
+
+import pygame
+
+# upper bounds in ms of the histogram buckets, the last bucket is open ended
+HISTOGRAM_BUCKETS = [0.25, 0.5, 1, 2, 4, 8, 16]
+OVERLAY_WIDTH = 126
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    values = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+# wall clock breakdown of the launch, from the first line of the game script to the first
+# presented frame. each mark closes the step since the previous one
+class StartupTimer:
+    def __init__(self, start):
+        self.start = start
+        self.last = start
+        self.marks = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.marks.append((name, now - self.last))
+        self.last = now
+
+    def report(self):
+        lines = ['Startup {:.1f} ms to the first frame'.format((self.last - self.start) * 1000)]
+        for name, elapsed in self.marks:
+            lines.append('  {:<16} {:>7.2f} ms'.format(name, elapsed * 1000))
+        return '\n'.join(lines)
+
+# stage timer for the main loop. each stage() call closes the previous stage, so the
+# frame is split into consecutive named slices without matching begin/end pairs.
+# when disabled every call returns immediately.
+class Profiler:
+    def __init__(self, enabled=False, window=120, keep_all=False, tracer=None):
+        self.enabled = enabled
+        self.tracer = tracer
+        self.frames = [] if keep_all else deque(maxlen=window)
+        self.stage_names = []
+        self.counts = {}
+        self.peaks = {}
+        self.current = None
+        self.current_start = 0
+        self.frame_start = 0
+        self.frame = {}
+        self.frame_counts = {}
+        self.in_frame = False
+
+    def start_frame(self):
+        if not self.enabled:
+            return
+        self.frame = {}
+        self.current = None
+        self.in_frame = True
+        self.frame_start = self.current_start = time.perf_counter()
+        if self.tracer:
+            self.tracer.begin('frame', self.frame_start)
+
+    def stage(self, name):
+        if not self.in_frame:
+            return
+        now = time.perf_counter()
+        if self.current:
+            self.frame[self.current] = self.frame.get(self.current, 0) + now - self.current_start
+            if self.tracer:
+                self.tracer.end(self.current, now)
+        if self.tracer and name:
+            self.tracer.begin(name, now)
+        if name and (name not in self.stage_names):
+            self.stage_names.append(name)
+        self.current = name
+        self.current_start = now
+
+    def count(self, name, value):
+        if not self.enabled:
+            return
+        self.counts[name] = value
+        self.frame_counts[name] = value
+        if value > self.peaks.get(name, 0):
+            self.peaks[name] = value
+
+    def end_frame(self):
+        # a frame that started while disabled is dropped, its timings would be partial
+        if not self.in_frame:
+            return
+        self.stage(None)
+        self.in_frame = False
+        self.frame['total'] = self.current_start - self.frame_start
+        self.frames.append(self.frame)
+        if self.tracer:
+            self.tracer.end('frame', self.current_start)
+            if self.frame_counts:
+                self.tracer.counter('entities', self.frame_counts, self.current_start)
+        self.frame_counts = {}
+
+    # closes the open trace slices of an interrupted frame without recording its timings
+    def abort_frame(self):
+        if not self.in_frame:
+            return
+        self.in_frame = False
+        if self.tracer:
+            now = time.perf_counter()
+            if self.current:
+                self.tracer.end(self.current, now)
+            self.tracer.end('frame', now)
+
+    def instant(self, name, **args):
+        if self.tracer:
+            self.tracer.instant(name, args, time.perf_counter())
+
+    def set_enabled(self, enabled):
+        if enabled and not self.enabled:
+            self.frames.clear()
+        self.enabled = enabled
+        if not enabled:
+            self.in_frame = False
+
+    def stage_times(self, name):
+        return [frame.get(name, 0) * 1000 for frame in self.frames]
+
+    def histogram(self, name):
+        buckets = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        for value in self.stage_times(name):
+            buckets[bisect.bisect_left(HISTOGRAM_BUCKETS, value)] += 1
+        return buckets
+
+    def summary(self):
+        output = {}
+        for name in self.stage_names + ['total']:
+            # stages skipped on some frames count as 0 ms there
+            values = self.stage_times(name)
+            if not values:
+                continue
+            output[name] = {
+                'mean': sum(values) / len(values),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99),
+                'max': max(values),
+            }
+        return output
+
+    def render_overlay(self, surf, font):
+        names = self.stage_names + ['total']
+        height = 14 + (len(names) + len(self.counts)) * 8
+        x = surf.get_width() - OVERLAY_WIDTH - 2
+        y = 17
+        panel = pygame.Surface((OVERLAY_WIDTH, height))
+        panel.fill((0, 0, 0))
+        panel.set_alpha(190)
+        surf.blit(panel, (x, y))
+        font.render('stage   avg   max', surf, (x + 3, y + 3))
+        y += 12
+        for name in names:
+            values = self.stage_times(name)
+            if values:
+                avg = sum(values) / len(values)
+                font.render(name[:8], surf, (x + 3, y))
+                font.render('{:.2f}'.format(avg), surf, (x + 42, y))
+                font.render('{:.1f}'.format(max(values)), surf, (x + 68, y))
+                buckets = self.histogram(name)
+                peak = max(buckets)
+                for i, amount in enumerate(buckets):
+                    if not amount:
+                        continue
+                    bar = math.ceil(amount / peak * 6)
+                    pygame.draw.line(surf, (0, 200, 255), (x + 92 + i * 4, y + 6), (x + 92 + i * 4, y + 7 - bar), 2)
+            y += 8
+        for name in self.counts:
+            font.render(name[:12] + ': ' + str(self.counts[name]), surf, (x + 3, y))
+            y += 8
@@ -0,0 +1,111 @@
+import os
+import json
+import math
+from collections import deque
+
+QUALITY_LEVELS = ['low', 'medium', 'high']
+# particles/sparks are the share of emitted effects that get spawned, max_glows caps the
+# light map per frame (None = no cap), fog_layers and back_waves control the backdrop
+QUALITY_PRESETS = {
+    'low': {'particles': 0.35, 'sparks': 0.5, 'max_glows': 24, 'fog_layers': 1, 'back_waves': False, 'lighting': 'low'},
+    'medium': {'particles': 0.65, 'sparks': 0.75, 'max_glows': 60, 'fog_layers': 2, 'back_waves': True, 'lighting': 'low'},
+    'high': {'particles': 1, 'sparks': 1, 'max_glows': None, 'fog_layers': 2, 'back_waves': True, 'lighting': 'medium'},
+}
+DEFAULT_CONFIG = {'quality': 'high', 'auto_quality': True}
+
+FRAME_BUDGET_MS = 1000 / 60
+# hysteresis: step down when the slow frames go over budget, step back up only when the
+# window is comfortably under it, and wait after every change before deciding again
+STEP_DOWN_RATIO = 1.1
+STEP_UP_RATIO = 0.6
+SAMPLE_WINDOW = 90
+COOLDOWN_FRAMES = 180
+STEP_UP_HOLD_FRAMES = 600
+
+def load_config(path):
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config.update(json.load(f))
+        except (OSError, ValueError):
+            print('Could not read ' + path + ', using default quality settings')
+    if config['quality'] not in QUALITY_PRESETS:
+        config['quality'] = DEFAULT_CONFIG['quality']
+    return config
+
+def save_config(path, config):
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=2)
+    except OSError:
+        # read-only or full data dir, the choice still applies to this run
+        print('Could not write ' + path + ', quality settings not saved')
+
+def slow_frame_ms(samples):
+    # 90th percentile, a few hitches shouldn't cost quality but sustained load should
+    values = sorted(samples)
+    return values[max(0, math.ceil(len(values) * 0.9) - 1)]
+
+# holds the active preset and thins effects to match it. with auto enabled it watches the
+# frame times and moves between presets, never above the level the player picked.
+class QualityController:
+    def __init__(self, level='high', auto=True):
+        self.target = level
+        self.level = level
+        self.auto = auto
+        self.settings = QUALITY_PRESETS[level]
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+        self.cooldown = 0
+        self.calm_frames = 0
+        self.emitted = {}
+
+    def set_level(self, level):
+        self.level = level
+        self.settings = QUALITY_PRESETS[level]
+        self.samples.clear()
+        self.cooldown = COOLDOWN_FRAMES
+        self.calm_frames = 0
+
+    # level picked by the player (menu/config), auto LOD starts again from there
+    def select(self, level):
+        self.target = level
+        self.set_level(level)
+
+    # deterministic thinning: with a share of 0.5 every other effect is kept. no random
+    # numbers are drawn so the game's random stream only depends on the active preset
+    def keep(self, kind):
+        share = self.settings[kind]
+        if share >= 1:
+            return True
+        self.emitted[kind] = self.emitted.get(kind, 0) + share
+        if self.emitted[kind] >= 1:
+            self.emitted[kind] -= 1
+            return True
+        return False
+
+    # feeds the work time of a frame, returns True when the preset changed
+    def update(self, frame_ms):
+        if not self.auto:
+            return False
+        self.samples.append(frame_ms)
+        if self.cooldown:
+            self.cooldown -= 1
+            return False
+        if len(self.samples) < SAMPLE_WINDOW:
+            return False
+        slow = slow_frame_ms(self.samples)
+        index = QUALITY_LEVELS.index(self.level)
+        if (slow > FRAME_BUDGET_MS * STEP_DOWN_RATIO) and (index > 0):
+            new_level = QUALITY_LEVELS[index - 1]
+            print('Quality {} -> {} (90th percentile frame {:.1f} ms over the {:.1f} ms budget)'.format(self.level, new_level, slow, FRAME_BUDGET_MS))
+            self.set_level(new_level)
+            return True
+        if (slow < FRAME_BUDGET_MS * STEP_UP_RATIO) and (index < QUALITY_LEVELS.index(self.target)):
+            self.calm_frames += 1
+            if self.calm_frames >= STEP_UP_HOLD_FRAMES:
+                self.set_level(QUALITY_LEVELS[index + 1])
+                return True
+        else:
+            self.calm_frames = 0
+        return False
@@ -0,0 +1,167 @@
+import gzip
+import json
+
+import pygame
+
+# 2: mouse positions are in logical (display surface) coordinates since the SCALED window
+REPLAY_VERSION = 2
+CHECKPOINT_INTERVAL = 60
+
+# compact event encoding: ['d', key, unicode], ['u', key], ['b', x, y, button], ['w', y], ['q'] and ['m', x, y, pressed] for mouse state changes
+def encode_event(event):
+    if event.type == pygame.QUIT:
+        return ['q']
+    if event.type == pygame.KEYDOWN:
+        return ['d', event.key, event.unicode]
+    if event.type == pygame.KEYUP:
+        return ['u', event.key]
+    if event.type == pygame.MOUSEBUTTONDOWN:
+        return ['b', event.pos[0], event.pos[1], event.button]
+    if event.type == pygame.MOUSEWHEEL:
+        return ['w', event.y]
+    return None
+
+def decode_event(dat):
+    if dat[0] == 'q':
+        return pygame.event.Event(pygame.QUIT)
+    if dat[0] == 'd':
+        return pygame.event.Event(pygame.KEYDOWN, key=dat[1], unicode=dat[2], mod=0)
+    if dat[0] == 'u':
+        return pygame.event.Event(pygame.KEYUP, key=dat[1], mod=0)
+    if dat[0] == 'b':
+        return pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(dat[1], dat[2]), button=dat[3])
+    if dat[0] == 'w':
+        return pygame.event.Event(pygame.MOUSEWHEEL, x=0, y=dat[1])
+    return None
+
+class Replay:
+    def __init__(self, seed, level=None, player_name='replay', quality='high'):
+        self.seed = seed
+        self.level = level
+        self.player_name = player_name
+        # effect thinning changes the random stream, so the preset is part of the replay
+        self.quality = quality
+        # each tick is [dt, *encoded_events]; dt is None for menu ticks
+        self.ticks = []
+        self.checkpoints = {}
+
+    def save(self, path):
+        dat = {
+            'version': REPLAY_VERSION,
+            'seed': self.seed,
+            'level': self.level,
+            'player_name': self.player_name,
+            'quality': self.quality,
+            'ticks': self.ticks,
+            'checkpoints': self.checkpoints,
+        }
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump(dat, f, separators=(',', ':'))
+
+def load_replay(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        dat = json.load(f)
+    if dat['version'] != REPLAY_VERSION:
+        raise ValueError('unsupported replay version: ' + str(dat['version']))
+    replay = Replay(dat['seed'], dat['level'], dat['player_name'], dat.get('quality', 'high'))
+    replay.ticks = dat['ticks']
+    replay.checkpoints = {int(k): v for k, v in dat['checkpoints'].items()}
+    return replay
+
+class LiveInput:
+    def __init__(self, recording=None):
+        self.recording = recording
+        self.tick = 0
+        self.mouse_pos = (0, 0)
+        self.mouse_pressed = False
+        self.last_mouse = None
+        self.finished = False
+
+    def poll(self):
+        events = pygame.event.get()
+        self.mouse_pos = pygame.mouse.get_pos()
+        self.mouse_pressed = pygame.mouse.get_pressed()[0]
+        if self.recording:
+            tick = [None]
+            if (self.mouse_pos, self.mouse_pressed) != self.last_mouse:
+                tick.append(['m', self.mouse_pos[0], self.mouse_pos[1], int(self.mouse_pressed)])
+            self.last_mouse = (self.mouse_pos, self.mouse_pressed)
+            for event in events:
+                dat = encode_event(event)
+                if dat:
+                    tick.append(dat)
+            self.recording.ticks.append(tick)
+        self.tick += 1
+        return events
+
+    def frame_dt(self, dt):
+        if self.recording:
+            # play on the rounded value too so the recording reproduces this run exactly
+            dt = round(dt, 4)
+            self.recording.ticks[-1][0] = dt
+        return dt
+
+    def checkpoint(self, state):
+        if self.recording and (self.tick % CHECKPOINT_INTERVAL == 0):
+            self.recording.checkpoints[self.tick] = state
+
+class ReplayInput:
+    def __init__(self, replay):
+        self.replay = replay
+        self.tick = 0
+        self.mouse_pos = (0, 0)
+        self.mouse_pressed = False
+        self.finished = False
+        self.desynced = False
+        self.dt = 1
+
+    def poll(self):
+        if self.tick >= len(self.replay.ticks):
+            self.finished = True
+            return [pygame.event.Event(pygame.QUIT)]
+        tick = self.replay.ticks[self.tick]
+        self.tick += 1
+        self.dt = tick[0]
+        events = []
+        for dat in tick[1:]:
+            if dat[0] == 'm':
+                self.mouse_pos = (dat[1], dat[2])
+                self.mouse_pressed = bool(dat[3])
+            else:
+                events.append(decode_event(dat))
+        return events
+
+    def frame_dt(self, dt):
+        if self.dt is None:
+            return dt
+        return self.dt
+
+    def checkpoint(self, state):
+        expected = self.replay.checkpoints.get(self.tick)
+        if (expected is not None) and (expected != state) and not self.desynced:
+            self.desynced = True
+            print('Replay desync at tick ' + str(self.tick) + ': expected ' + str(expected) + ', got ' + str(state))
+
+# deterministic stand-in for a recorded run: dismisses the objectives screen, then walks back and forth,
+# jumps on a fixed rhythm and periodically deploys the scanner so every subsystem gets exercised
+def scripted_replay(level, ticks, seed=0):
+    replay = Replay(seed, level)
+    replay.ticks.append([1.0, ['d', pygame.K_SPACE, ' '], ['u', pygame.K_SPACE]])
+    direction = pygame.K_RIGHT
+    replay.ticks.append([1.0, ['d', direction, '']])
+    for i in range(2, ticks):
+        tick = [1.0]
+        if i % 240 == 0:
+            tick.append(['u', direction])
+            direction = pygame.K_LEFT if direction == pygame.K_RIGHT else pygame.K_RIGHT
+            tick.append(['d', direction, ''])
+        if i % 45 == 0:
+            tick.append(['d', pygame.K_UP, ''])
+        if i % 45 == 12:
+            tick.append(['u', pygame.K_UP])
+        if i % 600 == 300:
+            tick.append(['d', pygame.K_DOWN, ''])
+        if i % 600 == 310:
+            tick.append(['u', pygame.K_DOWN])
+        replay.ticks.append(tick)
+    return replay
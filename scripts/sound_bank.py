@@ -0,0 +1,92 @@
+import os
+
+import pygame
+
+SFX_PATH = 'data/sfx'
+# sounds without an entry in the settings
+DEFAULT_SOUND = {'category': 'sfx', 'volume': 1.0, 'interval': 0}
+
+# sound effects by name. files are only indexed up front, a sound is decoded the first
+# time it plays (or by preload). every category owns a fixed set of reserved channels, so
+# a burst of one kind of sound can't take the channels of another, and triggers of the
+# same sound closer than its interval (ms) are coalesced into the one already playing.
+class SoundBank:
+    def __init__(self, categories, settings, path=SFX_PATH):
+        self.categories = categories
+        self.settings = settings
+        self.paths = {}
+        for sound_file in sorted(os.listdir(path)):
+            if sound_file.split('.')[-1] == 'wav':
+                self.paths[sound_file.split('.')[0]] = path + '/' + sound_file
+        self.loaded = {}
+        self.pending = {}
+        self.last_played = {}
+        self.pools = {}
+        self.started = {}
+        self.enabled = bool(pygame.mixer.get_init())
+        if self.enabled:
+            total = sum(category['channels'] for category in categories.values())
+            if pygame.mixer.get_num_channels() < total:
+                pygame.mixer.set_num_channels(total)
+            # Sound.play() picks from the unreserved channels, so it never steals from a pool
+            pygame.mixer.set_reserved(total)
+            index = 0
+            for name, category in categories.items():
+                self.pools[name] = [pygame.mixer.Channel(index + i) for i in range(category['channels'])]
+                index += category['channels']
+
+    def setting(self, name):
+        return self.settings.get(name, DEFAULT_SOUND)
+
+    def decode(self, name):
+        sound = pygame.mixer.Sound(self.paths[name])
+        sound.set_volume(self.setting(name)['volume'])
+        return sound
+
+    # decodes the sounds with submit(func, *args) -> future, usually on a worker thread
+    def preload(self, names, submit):
+        if not self.enabled:
+            return
+        for name in names:
+            if (name not in self.loaded) and (name not in self.pending):
+                self.pending[name] = submit(self.decode, name)
+
+    def get(self, name):
+        if name not in self.loaded:
+            try:
+                if name in self.pending:
+                    self.loaded[name] = self.pending.pop(name).result()
+                else:
+                    self.loaded[name] = self.decode(name)
+            except pygame.error:
+                # unreadable file or no mixer, the sound stays silent
+                self.loaded[name] = None
+        return self.loaded[name]
+
+    # a free channel of the category, or the one playing the longest if the category can steal
+    def channel(self, category):
+        pool = self.pools[category]
+        for channel in pool:
+            if not channel.get_busy():
+                return channel
+        if self.categories[category]['steal']:
+            return min(pool, key=lambda channel: self.started[channel])
+        return None
+
+    def play(self, name, now=None):
+        if (not self.enabled) or (name not in self.paths):
+            return False
+        setting = self.setting(name)
+        now = pygame.time.get_ticks() if now is None else now
+        if (name in self.last_played) and (now - self.last_played[name] < setting['interval']):
+            return False
+        sound = self.get(name)
+        if not sound:
+            return False
+        channel = self.channel(setting['category'])
+        if not channel:
+            return False
+        channel.play(sound)
+        self.last_played[name] = now
+        self.started[channel] = now
+        return True
@@ -1,42 +1,77 @@
 import pygame, os, json
 from .core_funcs import *
+from .atlas import atlas
+from .asset_cache import asset_cache
 
 COLORKEY = (0, 0, 0)
 
-def load_spritesheet(spritesheet):
-    rows = []
-    spritesheet_dat = []
-    for y in range(spritesheet.get_height()):
-        c = spritesheet.get_at((0, y))
-        c = (c[0], c[1], c[2])
-        if c == (255, 255, 0):
-            rows.append(y)
-    for row in rows:
+ROW_MARKER = bytes((255, 255, 0))
+TILE_START = bytes((255, 0, 255))
+TILE_END = bytes((0, 255, 255))
+SCAN_ROWS = 32
+
+# first x >= start where line (RGB bytes) has color, -1 if none. bytes.find can also match
+# across two pixels, those hits are skipped
+def find_pixel(line, color, start=0):
+    i = line.find(color, start * 3)
+    while (i != -1) and (i % 3):
+        i = line.find(color, i + 1)
+    return i if i == -1 else i // 3
+
+def find_pixels(line, color):
+    found = []
+    x = find_pixel(line, color)
+    while x != -1:
+        found.append(x)
+        x = find_pixel(line, color, x + 1)
+    return found
+
+# RGB bytes of column x from row y, for the given number of rows
+def column(pixels, pitch, x, y=0, rows=None):
+    start = y * pitch + x * 3
+    stop = len(pixels) if rows is None else min(len(pixels), (y + rows) * pitch)
+    col = bytearray(len(range(start, stop, pitch)) * 3)
+    for i in range(3):
+        col[i::3] = pixels[start + i:stop:pitch]
+    return col
+
+# first y > row where column x has color, -1 if none. tiles are short, so the column is
+# read in blocks instead of all the way to the bottom of the sheet
+def find_below(pixels, pitch, x, row, color):
+    y = row + 1
+    while y * pitch < len(pixels):
+        found = find_pixel(column(pixels, pitch, x, y, SCAN_ROWS), color)
+        if found != -1:
+            return y + found
+        y += SCAN_ROWS
+    return -1
+
+# rects of the tiles marked in a tileset, one list per row marked in yellow. each tile
+# starts at a magenta pixel and ends at the cyan pixels to its right and below. the sheet
+# is read into bytes once and searched with find/slicing instead of get_at per pixel
+def find_tiles(spritesheet):
+    pixels = pygame.image.tostring(spritesheet, 'RGB')
+    pitch = spritesheet.get_width() * 3
+    tiles = []
+    for row in find_pixels(column(pixels, pitch, 0), ROW_MARKER):
+        line = pixels[row * pitch:(row + 1) * pitch]
         row_content = []
-        for x in range(spritesheet.get_width()):
-            c = spritesheet.get_at((x, row))
-            c = (c[0], c[1], c[2])
-            if c == (255, 0, 255): # found tile
-                x2 = 0
-                while True:
-                    x2 += 1
-                    c = spritesheet.get_at((x + x2, row))
-                    c = (c[0], c[1], c[2])
-                    if c == (0, 255, 255):
-                        width = x2
-                        break
-                y2 = 0
-                while True:
-                    y2 += 1
-                    c = spritesheet.get_at((x, row + y2))
-                    c = (c[0], c[1], c[2])
-                    if c == (0, 255, 255):
-                        height = y2
-                        break
-                img = clip(spritesheet, x + 1, row + 1, x2 - 1, y2 - 1)
-                img.set_colorkey(COLORKEY)
-                row_content.append(img)
-        spritesheet_dat.append(row_content)
+        for x in find_pixels(line, TILE_START): # found tile
+            x2 = find_pixel(line, TILE_END, x + 1) - x
+            y2 = find_below(pixels, pitch, x, row, TILE_END) - row
+            if (x2 < 0) or (y2 < 0):
+                raise IndexError('tile at ' + str((x, row)) + ' has no end marker')
+            row_content.append((x + 1, row + 1, x2 - 1, y2 - 1))
+        tiles.append(row_content)
+    return tiles
+
+def load_spritesheet(spritesheet, tiles=None):
+    if tiles is None:
+        tiles = find_tiles(spritesheet)
+    spritesheet_dat = []
+    for row in tiles:
+        # the atlas copies the tile into its page, so a view of the sheet is enough
+        spritesheet_dat.append([atlas.add(view(spritesheet, *rect)) for rect in row])
     return spritesheet_dat
 
 def load_spritesheets(path):
@@ -45,7 +80,13 @@ def load_spritesheets(path):
     spritesheets_data = {}
     for img_file in spritesheet_list:
         if img_file.split('.')[-1] == 'png':
-            spritesheet_dat = load_spritesheet(pygame.image.load(path + '/' + img_file).convert())
+            img_path = path + '/' + img_file
+            tiles = asset_cache.get(('tiles', img_path), [img_path])
+            spritesheet = asset_cache.load_image(img_path).convert()
+            if tiles is None:
+                tiles = find_tiles(spritesheet)
+                asset_cache.put(('tiles', img_path), [img_path], tiles)
+            spritesheet_dat = load_spritesheet(spritesheet, tiles)
             spritesheets[img_file.split('.')[0]] = spritesheet_dat
             try:
                 dat = read_f(path + '/' + img_file.split('.')[0] + '.json')
@@ -2,21 +2,37 @@
 import pygame, sys
 from .core_funcs import *
 from .clip import clip
+from .asset_cache import asset_cache
+
+# (x, width) of each glyph, the glyphs are separated by columns with a grey top pixel
+def find_glyphs(font_img):
+    last_x = 0
+    glyphs = []
+    for x in range(font_img.get_width()):
+        if font_img.get_at((x, 0))[0] == 127:
+            glyphs.append((last_x, x - last_x))
+            last_x = x + 1
+    return glyphs
 
 def load_font_img(path, font_color):
     fg_color = (255, 0, 0)
     bg_color = (0, 0, 0)
-    font_img = pygame.image.load(path).convert()
+    # the scan runs on the recolored image, so a color with a red of 127 can add separators
+    # and can't use the glyphs cached for the source image
+    glyphs = None
+    if font_color[0] != 127:
+        glyphs = asset_cache.get(('glyphs', path), [path])
+    font_img = asset_cache.load_image(path).convert()
     font_img = swap_color(font_img, fg_color, font_color)
-    last_x = 0
+    if glyphs is None:
+        glyphs = find_glyphs(font_img)
+        if font_color[0] != 127:
+            asset_cache.put(('glyphs', path), [path], glyphs)
     letters = []
     letter_spacing = []
-    for x in range(font_img.get_width()):
-        if font_img.get_at((x, 0))[0] == 127:
-            letters.append(clip(font_img, last_x, 0, x - last_x, font_img.get_height()))
-            letter_spacing.append(x - last_x)
-            last_x = x + 1
-        x += 1
+    for x, width in glyphs:
+        letters.append(clip(font_img, x, 0, width, font_img.get_height()))
+        letter_spacing.append(width)
     for letter in letters:
         letter.set_colorkey(bg_color)
     return letters, letter_spacing, font_img.get_height()
@@ -0,0 +1,39 @@
+import os
+import json
+import time
+
+# streams Chrome Trace Event Format (JSON array) so long sessions never sit in memory.
+# viewers accept a missing closing bracket, so a crashed session still opens.
+class TraceWriter:
+    def __init__(self, path):
+        self.f = open(path, 'w', encoding='utf-8')
+        self.f.write('[\n')
+        self.start = time.perf_counter()
+        self.pid = os.getpid()
+        self.first = True
+        self.event({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': 0, 'args': {'name': 'main loop'}})
+
+    def ts(self, t):
+        return round((t - self.start) * 1e6, 1)
+
+    def event(self, dat):
+        if not self.first:
+            self.f.write(',\n')
+        self.first = False
+        self.f.write(json.dumps(dat, separators=(',', ':')))
+
+    def begin(self, name, t):
+        self.event({'name': name, 'ph': 'B', 'ts': self.ts(t), 'pid': self.pid, 'tid': 0})
+
+    def end(self, name, t):
+        self.event({'name': name, 'ph': 'E', 'ts': self.ts(t), 'pid': self.pid, 'tid': 0})
+
+    def counter(self, name, values, t):
+        self.event({'name': name, 'ph': 'C', 'ts': self.ts(t), 'pid': self.pid, 'tid': 0, 'args': values})
+
+    def instant(self, name, args, t):
+        self.event({'name': name, 'ph': 'i', 's': 'g', 'ts': self.ts(t), 'pid': self.pid, 'tid': 0, 'args': args})
+
+    def close(self):
+        self.f.write('\n]\n')
+        self.f.close()